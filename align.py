@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+
+# when the session opens/closes (exchange local time). an event at or after the cutoff of the
+# price Stock trades on (the open for market_time='Open', the close otherwise) can only be acted
+# on the next bar, it can't trade at the print it lands on. events stamped exactly midnight only
+# carry a date and count for that day's bar
+MARKET_OPEN = pd.Timedelta(hours=9, minutes=30)
+MARKET_CLOSE = pd.Timedelta(hours=16)
+
+# bars an event's value is carried forward for, None carries it until the next event
+MAX_STALENESS = None
+
+
+class TradingCalendar:
+    # the bars of a price history, events are snapped onto them and carried forward with as-of
+    # lookups so nothing ever has to be outer merged with the prices
+    def __init__(self, bars, market_time='Close') -> None:
+        self.bars = pd.DatetimeIndex(bars)
+        self.days = self.bars.normalize()
+        self.cutoff = MARKET_OPEN if market_time == 'Open' else MARKET_CLOSE
+
+    def snap(self, timestamps):
+        # position of the first bar each event can be traded on (weekends and holidays go to the
+        # next session). len(bars) for anything after the last bar
+        timestamps = pd.DatetimeIndex(timestamps)
+        days = timestamps.normalize()
+        late = (timestamps != days) & (timestamps - days >= self.cutoff)
+        days = days + pd.to_timedelta(late.astype(np.int64), unit='D')
+        return self.days.searchsorted(days, side='left')
+
+    def align(self, timestamps, values, max_staleness=MAX_STALENESS):
+        # a value on every bar: the mean of the events snapped to the latest bar at or before it
+        # that had any, nan before the first event and once that bar is more than max_staleness
+        # bars back
+        values = np.asarray(values, dtype=float)
+        positions = self.snap(timestamps)
+        keep = (positions < len(self.bars)) & ~np.isnan(values)
+        if not keep.any():
+            return pd.Series(np.nan, index=self.bars)
+
+        # every event bar's mean, bars in order
+        sums = np.bincount(positions[keep], weights=values[keep], minlength=len(self.bars))
+        counts = np.bincount(positions[keep], minlength=len(self.bars))
+        event_bars = np.flatnonzero(counts)
+        means = sums[event_bars] / counts[event_bars]
+
+        # as-of: the last event bar at or before every bar
+        latest = np.searchsorted(event_bars, np.arange(len(self.bars)), side='right') - 1
+        known = latest >= 0
+        if max_staleness is not None:
+            known &= np.arange(len(self.bars)) - event_bars[np.maximum(latest, 0)] <= max_staleness
+
+        aligned = np.full(len(self.bars), np.nan)
+        aligned[known] = means[latest[known]]
+        return pd.Series(aligned, index=self.bars)
+
+
+def band(aligned, unknown=-999):
+    # the -1/0/1 bound of an aligned score, unknown (before the first event or gone stale) where nan.
+    # the smallest integer type that holds them
+    return pd.to_numeric(np.sign(aligned).fillna(unknown), downcast='integer')
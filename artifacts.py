@@ -0,0 +1,107 @@
+import datetime
+import hashlib
+import inspect
+import json
+import os
+import pandas as pd
+
+
+# bump to force every figure and report to be rebuilt
+ARTIFACT_VERSION = 1
+
+
+def _update(digest, part):
+    # feed anything the pipeline passes around into the hash in a stable way
+    if isinstance(part, (pd.Series, pd.DataFrame)):
+        if isinstance(part, pd.DataFrame):
+            layout = (list(part.columns), [str(dtype) for dtype in part.dtypes])
+        else:
+            layout = (part.name, str(part.dtype))
+        digest.update(repr((type(part).__name__, part.shape, layout)).encode())
+        digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+    elif isinstance(part, pd.Index):
+        digest.update(pd.util.hash_pandas_object(part.to_series(), index=False).to_numpy().tobytes())
+    elif isinstance(part, dict):
+        for key in sorted(part, key=str):
+            digest.update(repr(key).encode())
+            _update(digest, part[key])
+    elif isinstance(part, (list, tuple)):
+        digest.update(repr((type(part).__name__, len(part))).encode())
+        for item in part:
+            _update(digest, item)
+    elif callable(part) or inspect.ismodule(part):
+        # functions (and whole modules) are identified by their source so editing the code
+        # invalidates its outputs
+        digest.update(inspect.getsource(part).encode())
+    else:
+        digest.update(repr(part).encode())
+    digest.update(b'|')
+
+
+def fingerprint(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    _update(digest, ARTIFACT_VERSION)
+    for part in parts:
+        _update(digest, part)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    # remembers the fingerprint of the inputs every figure/report was built from.
+    # the manifest (one json per ticker) also records what the last run rebuilt and why
+    def __init__(self, path, ticker) -> None:
+        self.path = path
+        self.ticker = ticker
+        self.artifacts = {}
+        self.last_run = []
+
+        try:
+            with open(self.file_name()) as f:
+                self.artifacts = json.load(f).get('artifacts', {})
+        except (FileNotFoundError, ValueError):
+            self.artifacts = {}
+
+    def file_name(self):
+        return os.path.join(self.path, '{}.json'.format(self.ticker))
+
+    def check(self, artifact, artifact_fingerprint):
+        # (reusable, reason)
+        stored = self.artifacts.get(artifact)
+        if stored is None:
+            return False, 'not built before'
+        if not os.path.isfile(artifact):
+            return False, 'file missing'
+        if stored['fingerprint'] != artifact_fingerprint:
+            return False, 'inputs changed'
+        return True, 'unchanged'
+
+    def reuse(self, artifact, reason='unchanged'):
+        self.last_run.append({'artifact': artifact, 'action': 'reused', 'reason': reason})
+
+    def record(self, artifact, artifact_fingerprint, reason):
+        self.artifacts[artifact] = {
+            'fingerprint': artifact_fingerprint,
+            'built': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        self.last_run.append({'artifact': artifact, 'action': 'rebuilt', 'reason': reason})
+
+    def forget(self, artifact):
+        # the build failed so the next run has to try again
+        self.artifacts.pop(artifact, None)
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        manifest = {
+            'ticker': self.ticker,
+            'updated': datetime.datetime.now().isoformat(timespec='seconds'),
+            'last_run': self.last_run,
+            'artifacts': self.artifacts,
+        }
+        temp_file = self.file_name() + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_file, self.file_name())
+
+    def summary(self):
+        rebuilt = sum(entry['action'] == 'rebuilt' for entry in self.last_run)
+        return '{} artifacts rebuilt, {} reused'.format(rebuilt, len(self.last_run) - rebuilt)
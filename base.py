@@ -1,23 +1,32 @@
 # %%
 import datetime
-import time
 import yfinance as yf
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import WebDriverException, TimeoutException
 from selenium.webdriver.common.by import By
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from selenium.webdriver.support import expected_conditions as EC
 import numpy as np
-import finta as TA
-import matplotlib.pyplot as plt
-import matplotlib.collections as collections
-import matplotlib.dates as mdates
 import os
 import docx
-from docx.shared import Inches
 import gc
 import sys
+from sentiment import SentimentEngine, SentimentCache
+from prices import PriceStore
+from forward_returns import forward_return_frame, forward_return_stats, stats_by_bound, horizon_column
+from indicators import compute_indicators
+from regimes import to_runs
+from artifacts import ArtifactCache, fingerprint
+from report import add_figure, add_stats_table, REPORT_DPI, REPORT_MODULES
+from render import FigureRenderer, render_total, render_years, render_shift
+from recommendations import load_rules, encode_recommendations, RULES_PATH
+from browser import shared_pool, retry, wait_for, wait_for_text, click
+from http_backend import HttpScraper
+from dates import normalize_dates
+from store import TextStore
+from metrics import RunMetrics, NO_SPAN, row_count, METRICS_PATH, MEMORY_MODES
+from lean import compact_prices, compact_bounds, footprint
+from align import TradingCalendar, band, MAX_STALENESS
+from dedup import collapse_headlines, DEDUP_HEADLINES
 
 
 
@@ -27,32 +36,57 @@ TICKER_LIST = ["aapl","goog","ko","mmm","msft","nee","noc","ntr","pfe","pnc","py
 # url for nasdaq
 NEWS_URL = "https://www.nasdaq.com/market-activity/stocks/{}/news-headlines"
 
+# nasdaq's headline list, the last numbered tab button (the tab count) and the next tab arrow
+NEWS_LIST = "/html/body/div[3]/div/main/div[2]/div[4]/div[3]/div/div[1]/div/div[1]/ul"
+NEWS_LAST_TAB = "/html/body/div[3]/div/main/div[2]/div[4]/div[3]/div/div[1]/div/div[1]/div[3]/div/button[8]"
+NEWS_NEXT_TAB = "/html/body/div[3]/div/main/div[2]/div[4]/div[3]/div/div[1]/div/div[1]/div[3]/button[2]"
+
 # url for yahoo finance
 ANALYST_URL = "https://finance.yahoo.com/quote/{}/analysis?p={}"
 
+# yahoo's consent popup, the button that opens the upgrades/downgrades table and the table body
+ANALYST_POPUP = '//*[@id="myLightboxContainer"]/section/button[1]'
+ANALYST_BUTTON = '//*[@id="Col2-6-QuoteModule-Proxy"]/div/section/button'
+ANALYST_TABLE = '//*[@id="Col2-6-QuoteModule-Proxy"]/div/section/table/tbody'
+
+# seconds to wait for the popup, most of the time there isn't one
+POPUP_TIMEOUT = 2
+
+# 'browser' drives the pages with selenium, 'http' fetches the json behind them (see http_backend.py)
+SCRAPERS = ('browser', 'http')
+
 # pathname
 mypath = os.getcwd()
 
 # analysis periods
 periods = [1,3,7,14,21,28]
 
-# kinda lazy so set up a simple date conversion for month str to int
-DATES = {
-    "JAN":"01",
-    "FEB":"02",
-    "MAR":"03",
-    "APR":"04",
-    "MAY":"05",
-    "JUN":"06",
-    "JUL":"07",
-    "AUG":"08",
-    "SEP":"09",
-    "OCT":"10",
-    "NOV":"11",
-    "DEC":"12"
-}
-
-DPI = 600
+# figure resolution. savefig used to ignore set_dpi so figures have always come out at
+# matplotlib's default of 100, keep that unless a run asks for more
+DPI = 100
+
+# processes used to render figures, None uses every core and 1 renders in this process
+RENDER_WORKERS = None
+
+# number of processes used to score headlines, None uses every core
+SENTIMENT_WORKERS = None
+
+# headline scores are cached here so reruns only score new headlines
+SENTIMENT_CACHE = mypath+'/cache/sentiment'
+
+# fingerprints of the inputs each figure/report was built from, unchanged ones are reused
+ARTIFACT_CACHE = mypath+'/cache/artifacts'
+
+# set to False to only use the locally stored price history (no network once a ticker is stored)
+PRICE_REFRESH = True
+
+# set to True to record time/memory/rows for every stage, or to one of metrics.MEMORY_MODES
+# to pick how memory is measured (True measures rss)
+INSTRUMENT = False
+
+# set to True for the memory lean mode: float32 prices where precision allows, int8/int16 bounds,
+# no second copies of the prices and intermediates dropped once they have been used
+LEAN = False
 
 # make directory for figures if it isnt made
 if os.path.isdir(mypath+'/figs'):
@@ -61,11 +95,88 @@ else:
     os.mkdir(mypath+'/figs')
 
 class Stock:
-    def __init__(self, ticker, market_time='Close') -> None:
+    # pipeline stages in the order they run when everything is built up front.
+    # name: (method, stages it needs first, attributes it sets, progress message)
+    STAGES = {
+        'prices': ('load_prices', [], ['stock', 'price_history', 'price_history_lower', 'calendar'],
+                   "Gathering price and volume history for {}"),
+        'sentiment': ('sentiment_analysis', ['prices'], ['headlines', 'sentiment'],
+                      "Querying historical headline data and running sentiment analysis"),
+        'analyst': ('analyst_recommendation', ['prices'], ['analyst', 'analyst_stripped'],
+                    "Querying historical analysts' data"),
+        'indicators': ('calculate_indicators', ['prices'], ['rsi', 'obv', 'dmi', 'adx'],
+                       "Calculating RSI, OBV, DMI and ADX"),
+        'analyst_accuracy': ('analyst_accuracy', ['analyst'], [], 'Running accuracy analysis for analysts'),
+        'TA_accuracy': ('TA_accuracy', ['indicators'], [], 'Running accuracy anaysis for TAs'),
+        'headline_accuracy': ('headline_accuracy', ['sentiment'], [], 'Running accuracy analysis for headlines'),
+        'report': ('generate_report', ['analyst_accuracy', 'TA_accuracy', 'headline_accuracy'], [],
+                   'Generating report'),
+    }
+
+    # stage: (rows going in, rows coming out), only looked at when instrumented
+    STAGE_ROWS = {
+        'prices': (lambda s: None, lambda s: row_count(s.__dict__.get('price_history'))),
+        'sentiment': (lambda s: row_count(s.__dict__.get('headlines')),
+                      lambda s: row_count(s.__dict__.get('sentiment'))),
+        'analyst': (lambda s: row_count(s.__dict__.get('analyst')),
+                    lambda s: row_count(s.__dict__.get('analyst_stripped'))),
+        'indicators': (lambda s: row_count(s.__dict__.get('price_history')),
+                       lambda s: row_count(s.__dict__.get('rsi'))),
+        'analyst_accuracy': (lambda s: row_count(s.__dict__.get('analyst_stripped')),
+                             lambda s: row_count(s.data['Analysts'].get('Analysis', {}).get('stats'))),
+        'TA_accuracy': (lambda s: row_count(s.__dict__.get('rsi')),
+                        lambda s: sum(len(stats['stats']) for stats in s.data['TA'].values() if 'stats' in stats)),
+        'headline_accuracy': (lambda s: row_count(s.__dict__.get('sentiment')),
+                              lambda s: row_count(s.data['Headlines'].get('Analysis', {}).get('stats'))),
+        'report': (lambda s: len(s.figures), lambda s: None),
+    }
+
+    def __init__(self, ticker, market_time='Close', sentiment_workers=SENTIMENT_WORKERS,
+                 sentiment_cache=SENTIMENT_CACHE, price_store=None, price_refresh=PRICE_REFRESH,
+                 analyst_rules=RULES_PATH, lazy=False, dpi=DPI, fig_format='png', stats_only=False,
+                 render_workers=RENDER_WORKERS, artifact_cache=ARTIFACT_CACHE, browser_pool=None,
+                 scraper='browser', http_scraper=None, text_store=None, instrument=INSTRUMENT,
+                 metrics_path=METRICS_PATH, lean=LEAN, max_staleness=MAX_STALENESS,
+                 dedup_headlines=DEDUP_HEADLINES) -> None:
         # initalize the given ticker name
         self.ticker = ticker
         self.market_time = market_time
+        self.sentiment_engine = SentimentEngine(
+            workers=sentiment_workers,
+            cache=SentimentCache(sentiment_cache) if sentiment_cache else None
+        )
+        self.price_store = price_store if price_store is not None else PriceStore(mypath+'/prices')
+        self.text_store = text_store if text_store is not None else TextStore(mypath+'/store')
+        self.price_refresh = price_refresh
+        self.analyst_rules = load_rules(analyst_rules)
+        self.lean = lean
+
+        # headline/analyst values are carried forward for at most this many bars, None for ever
+        self.max_staleness = max_staleness
+        self.dedup_headlines = dedup_headlines
+
+        # how headlines and analyst recommendations get scraped when there is nothing stored
+        if scraper not in SCRAPERS:
+            raise ValueError("scraper must be one of {}".format(", ".join(SCRAPERS)))
+        self.scraper = scraper
+
+        # browser sessions for scraping, by default one shared by every Stock in this process
+        self.browser_pool = browser_pool if browser_pool is not None else shared_pool()
+        self.http_scraper = http_scraper if http_scraper is not None else HttpScraper()
+
+        # stats_only still works out all of the statistics but never draws a figure or writes the report
+        self.stats_only = stats_only
+        self.artifacts = ArtifactCache(artifact_cache, self.ticker) if artifact_cache else None
+        self.renderer = FigureRenderer(
+            workers=render_workers, dpi=dpi, fig_format=fig_format, enabled=not stats_only, cache=self.artifacts
+        )
         print("Initializing ticker {}".format(self.ticker))
+
+        # per stage time/memory/rows when instrumented. a built up front Stock writes them to
+        # metrics_path, a lazy one can call self.metrics.save() whenever it likes
+        self.metrics = None
+        if instrument:
+            self.metrics = RunMetrics(self.ticker, memory=instrument if instrument in MEMORY_MODES else 'rss')
         
         # initialize variable for random data to be stored
         self.data = {
@@ -80,283 +191,292 @@ class Stock:
             }
         }
         
+        # figure name -> file the renderer wrote it to, filled in by the accuracy functions
+        self.figures = {}
+
         # Check if dir exist, Otherwise make it
         if os.path.isdir(mypath+'/figs/{}'.format(self.ticker)):
             pass
         else:
             os.mkdir(mypath+'/figs/{}'.format(self.ticker))
 
-        # use yfinance to get historical price/volume data
-        print("Gathering price and volume history for {}".format(self.ticker))
-        self.stock = yf.Ticker(self.ticker)
-        self.price_history = self.stock.history(period="max")
-        
-        # Love new updates... this fixes localized datetime
-        self.price_history.index = self.price_history.index.tz_localize(None)
+        # stages that have already run
+        self.completed_stages = set()
 
-        # FinTa requires the column names to be in lower case so recast the column names
-        self.price_history_lower = self.price_history.copy()
-        self.price_history_lower.columns = ["open", "high", "low", "close", "volume", "dividends", "stock splits"]
+        # in lazy mode nothing else runs until it is asked for, either with require()
+        # or by touching an attribute a stage produces (e.g. self.rsi)
+        if not lazy:
+            for stage in self.STAGES:
+                self.require(stage)
+            with self.span('render_wait'):
+                self.renderer.wait()
+            print("Holding {:.1f} MB for {}".format(self.memory_footprint().sum(), self.ticker))
+            if self.metrics is not None and metrics_path:
+                print("Wrote metrics to {}".format(", ".join(self.metrics.save(metrics_path))))
+
+############### END of __init__ ##################################
 
+    def require(self, *stages):
+        # run the given stages (and anything they depend on) once each
+        for stage in stages:
+            if stage in self.completed_stages:
+                continue
+            method, depends_on, _, message = self.STAGES[stage]
+            self.require(*depends_on)
+            print(message.format(self.ticker))
+            if self.metrics is None:
+                getattr(self, method)()
+            else:
+                rows_in, rows_out = self.STAGE_ROWS[stage]
+                with self.metrics.stage(stage) as record:
+                    getattr(self, method)()
+                    record['rows_in'], record['rows_out'] = rows_in(self), rows_out(self)
+            self.completed_stages.add(stage)
+        return self
+
+    def span(self, name):
+        # time a piece of a stage (scraping, scoring...) when instrumented, a no-op otherwise
+        if self.__dict__.get('metrics') is None:
+            return NO_SPAN
+        return self.metrics.stage(name)
+
+    def __getattr__(self, name):
+        # only called when an attribute is missing, so build whichever stage makes it.
+        # nothing is built before __init__ has set up completed_stages
+        completed = self.__dict__.get('completed_stages')
+        for stage, (_, _, products, _) in type(self).STAGES.items():
+            if name in products and completed is not None and stage not in completed:
+                self.require(stage)
+                return self.__dict__[name]
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    @property
+    def news_history(self):
         # This is kinda deprecated due to its limited usage and replaced with scraping NASDAQ
-        self.news_history = self.stock.news
-
-        # attempt to run sentiment analysis. This may initalize scraping if headline file doesn't exist
-        print("Querying historical headline data and running sentiment analysis")
-        self.sentiment_analysis()
-        
-        # # attempt to get analyst recommendations
-        print("Querying historical analysts' data")
-        self.analyst_recommendation()
-
-        # TAs will be autogenerated from the data at the start of each clas creation
-        # TAs implemented are:
-        '''
-        RSI (30,70)
-        OBV (grad-, grad+)
-        DMI (DMI-, DMI+) ->
-        ADX (25, 50, 75)
-        SMA
-        '''
-
-        # Calculate RSI and set up bounds
-        print("Calculating RSI")
-        self.rsi = TA.TA.RSI(self.price_history_lower).to_frame()
-        self.rsi = self.rsi.dropna()
-        self.rsi["bounds"] = 0
-        self.rsi.loc[self.rsi["14 period RSI"]>=70, "bounds"] = 1
-        self.rsi.loc[self.rsi["14 period RSI"]<=30, "bounds"] = -1
-
-        # Calculate OBV and set up bounds
-        print("Calculating OBV")
-        self.obv = TA.TA.OBV(self.price_history_lower).to_frame()
-        self.obv = self.obv.dropna()
-        self.obv["diff"] = self.obv["OBV"].diff()
-        self.obv["bounds"] = 0
-        self.obv = self.obv.dropna()
-        self.obv.loc[self.obv["diff"] > 0, "bounds"] = 1
-        self.obv.loc[self.obv["diff"] < 0, "bounds"] = -1
-
-        # Calculate DMI and set up bounds
-        print("Calculating DMI")
-        self.dmi = TA.TA.DMI(self.price_history_lower)
-        self.dmi = self.dmi.dropna()
-        self.dmi["dmi_bounds"] = 0
-        self.dmi.loc[self.dmi["DI+"] > self.dmi["DI-"], "dmi_bounds"] = 1
-        self.dmi.loc[self.dmi["DI+"] < self.dmi["DI-"], "dmi_bounds"] = -1
-
-        # Calculate ADX and set up bounds
-        print("Calculating ADX")
-        self.adx = TA.TA.ADX(self.price_history_lower).to_frame()
-        self.adx = pd.merge(self.dmi, self.adx, 'outer', left_index=True, right_index=True)
-        self.adx = self.adx.dropna()
-        self.adx['bounds'] = 0
-        self.adx.loc[(self.adx['14 period ADX.']>25) & (self.adx['dmi_bounds'] == 1) , 'bounds'] = 1
-        self.adx.loc[(self.adx['14 period ADX.']>25) & (self.adx['dmi_bounds'] == -1) , 'bounds'] = -1
-        self.adx.loc[(self.adx['14 period ADX.']>50) & (self.adx['dmi_bounds'] == 1) , 'bounds'] = 2
-        self.adx.loc[(self.adx['14 period ADX.']>50) & (self.adx['dmi_bounds'] == -1) , 'bounds'] = -2
-        self.adx.loc[(self.adx['14 period ADX.']>75) & (self.adx['dmi_bounds'] == 1) , 'bounds'] = 3
-        self.adx.loc[(self.adx['14 period ADX.']>75) & (self.adx['dmi_bounds'] == -1) , 'bounds'] = -3
-        
-        # run analysis
-        # analysis for analysts'
-        print('Running accuracy analysis for analysts')
-        self.analyst_accuracy()
-        
-        # run TA
-        print('Running accuracy anaysis for TAs')
-        self.TA_accuracy()
-        
-        print('Running accuracy analysis for headlines')
-        self.headline_accuracy()
-        
-        print('Generating report')
-        self.generate_report()
+        # only fetched when asked for so constructing a Stock can work offline
+        return self.stock.news
 
-############### END of __init__ ##################################
+############### Price History and TAs ###############################
+    def load_prices(self):
+        # get historical price/volume data from the local store, only downloading new bars
+        self.stock = yf.Ticker(self.ticker)
+        self.price_history = self.price_store.history(self.ticker, refresh=self.price_refresh)
+
+        # the trading days every event gets lined up with
+        self.calendar = TradingCalendar(self.price_history.index, self.market_time)
+
+        if self.lean:
+            self.price_history = compact_prices(self.price_history)
+            # same data under lower case names, not a second copy of it
+            self.price_history_lower = self.price_history.rename(columns=str.lower, copy=False)
+            return self.price_history
+
+        # lower case copy of the columns for anyone using FinTa style indicators on it
+        self.price_history_lower = self.price_history.copy()
+        self.price_history_lower.columns = ["open", "high", "low", "close", "volume", "dividends", "stock splits"]
+        return self.price_history
+
+    # TAs implemented are:
+    #     RSI (30,70)
+    #     OBV (grad-, grad+)
+    #     DMI (DMI-, DMI+) ->
+    #     ADX (25, 50, 75)
+    #     SMA
+    def calculate_indicators(self):
+        # RSI, OBV, DMI and ADX with their bounds all come out of one pass over the price history
+        indicators = compute_indicators(self.price_history)
+        self.rsi = indicators['rsi']
+        self.obv = indicators['obv']
+        self.dmi = indicators['dmi']
+        self.adx = indicators['adx']
+        if self.lean:
+            for frame in (self.rsi, self.obv, self.adx):
+                frame['bounds'] = compact_bounds(frame['bounds'])
+            self.dmi['dmi_bounds'] = compact_bounds(self.dmi['dmi_bounds'])
+            self.adx['dmi_bounds'] = compact_bounds(self.adx['dmi_bounds'])
+        return indicators
 
 ############### Scraping Functions ###############################
-    def scrape_news(self, save=True):
+    def scrape_news(self, save=True, stop_at=None):
+        # when updating, stop_at holds the (timestamp, headline) pairs that are already stored
+        with self.span('scrape_news'):
+            if self.scraper == 'http':
+                df = self.http_scraper.news(self.ticker, stop_at=stop_at)
+            else:
+                df = self.browse_news(stop_at)
+
+        # add to the store (skipping anything already there). The default is true
+        if save:
+            self.text_store.append('headlines', self.ticker, df)
+    
+        # set data to self
+        self.headlines = df
+        return self.headlines
+
+    def browse_news(self, stop_at=None):
         # get current time to help identify the date of the article
         # this is mostly an edge case for articles written within 24 hrs
         now = datetime.datetime.now()
         url = NEWS_URL.format(self.ticker)
 
-        # initialize selenium webdriver and open page
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
-        driver.get(url)
-
-        # try/except is mostly for my slow internet. It will keep trying 20 times or until it works
-        # get the number of tabs to find out how many times to iterate
-        attempts = 0
-        while attempts < 20:
-            try:
-                time.sleep(5)
-                total_tabs = driver.find_element(by=By.XPATH, value="/html/body/div[3]/div/main/div[2]/div[4]/div[3]/div/div[1]/div/div[1]/div[3]/div/button[8]").text
-                break
-            except:
-                attempts += 1
-        total_tabs = int(total_tabs)
-        print("total tabs: {}".format(total_tabs))
-
-        # set up csv column names
-        self.headlines = [["Date", "Headline"]]
-
-        # scrape data from NASDAQ
-        for i in range(total_tabs):
-            results = False
-            attempts = 0
-            while attempts < 20:
-                try:
-                    time.sleep(0.5)
-                    print("scraping tab {}".format(i+1))
-                    current_page_list = driver.find_element(by=By.XPATH, value="/html/body/div[3]/div/main/div[2]/div[4]/div[3]/div/div[1]/div/div[1]/ul")
+        # one frame per tab
+        headlines = []
+
+        # tabs are newest first so the first page with a known headline means we have caught up
+        caught_up = False
+
+        with self.browser_pool.session() as driver:
+            # get the number of tabs to find out how many times to iterate
+            def open_page():
+                driver.get(url)
+                return int(wait_for_text(driver, NEWS_LAST_TAB))
+
+            total_tabs = retry(open_page, "loading {} headlines".format(self.ticker),
+                               retry_on=(WebDriverException, ValueError))
+            print("total tabs: {}".format(total_tabs))
+
+            # scrape data from NASDAQ
+            previous_page = None
+            for i in range(total_tabs):
+                def read_tab():
+                    # the list is swapped in place when a tab is clicked, so wait for new contents
+                    page_text = wait_for_text(driver, NEWS_LIST, previous=previous_page)
+                    current_page_list = driver.find_element(by=By.XPATH, value=NEWS_LIST)
                     options = current_page_list.find_elements(by=By. TAG_NAME, value="li")
 
+                    # first line is the date, the rest is the headline (some wrap onto extra lines)
+                    page = []
                     for headline in options:
                         headline_text = headline.text.split("\n")
-                        if "HOURS" in headline_text[0]:
-                            post_time = now-datetime.timedelta(hours=int(headline_text[0].split(" ")[0]))
-                            headline_text[0] = post_time.strftime("%m/%d/%Y")
-                        elif "DAY" in headline_text[0]:
-                            post_time = now-datetime.timedelta(days=int(headline_text[0].split(" ")[0]))
-                            headline_text[0] = post_time.strftime("%m/%d/%Y")
-                        elif "MIN" in headline_text[0]:
-                            post_time = now-datetime.timedelta(minutes=int(headline_text[0].split(" ")[0]))
-                            headline_text[0] = post_time.strftime("%m/%d/%Y")
-                        elif "HOUR" in headline_text[0]:
-                            post_time = now-datetime.timedelta(hours=int(headline_text[0].split(" ")[0]))
-                            headline_text[0] = post_time.strftime("%m/%d/%Y")
-                        else:
-                            post_time = headline_text[0].split(" ")
-                            post_time_full = str(DATES[post_time[0]])+"/"
-                            post_time_full += str(post_time[1]).replace(",","")+"/"
-                            post_time_full += str(post_time[2])
-                            headline_text[0] = post_time_full
-
-                        # reformat some weird headlines with extra \n
-                        if len(headline_text) > 2:
-                            temp_headline = headline_text[1]
-                            for element in range(len(headline_text)-2):
-                                temp_headline += " "+headline_text[i+2]
-                            temp_date = headline_text[0]
-                            headline_text = [temp_date, temp_headline]
-
-
-                        
-                        self.headlines.append(headline_text)
-                    
-                    break
+                        page.append([headline_text[0], " ".join(headline_text[1:])])
+                    return page_text, page
 
-                except:
-                    attempts += 1
+                previous_page, page = retry(read_tab, "reading {} headline tab {}".format(self.ticker, i+1))
+                page = pd.DataFrame(page, columns=["Date", "Headline"])
 
-            # click for the next tab
-            next_tab_button = driver.find_element(by=By.XPATH, value="/html/body/div[3]/div/main/div[2]/div[4]/div[3]/div/div[1]/div/div[1]/div[3]/button[2]")
-            driver.execute_script("arguments[0].click();", next_tab_button)
+                # "5 HOURS AGO" style dates count back from when the scrape started
+                page["Date"], unparsed = normalize_dates(page["Date"], now)
+                if len(unparsed):
+                    print("skipping {} headlines with unknown dates: {}".format(len(unparsed), ", ".join(unparsed)))
+                    page = page[page["Date"].notna()]
+                print("scraped tab {}".format(i+1))
 
-        # save as a csv. The default is true
-        
-        df = pd.DataFrame(self.headlines[1:], columns=self.headlines[0])
-        df.to_csv("headlines/{}.csv".format(self.ticker), index=False)
-    
-        # set data to self
-        self.headlines = df
-        return self.headlines
+                if stop_at is not None:
+                    new_headlines = [(date, headline) not in stop_at for date, headline in zip(page["Date"], page["Headline"])]
+                    caught_up = not all(new_headlines)
+                    page = page[new_headlines]
+
+                headlines.append(page)
+
+                if caught_up:
+                    print("caught up with stored headlines after {} tabs".format(i+1))
+                    break
+
+                # click for the next tab
+                if i+1 < total_tabs:
+                    retry(
+                        lambda: click(driver, wait_for(driver, NEWS_NEXT_TAB, condition=EC.element_to_be_clickable)),
+                        "opening {} headline tab {}".format(self.ticker, i+2)
+                    )
+
+        if not headlines:
+            return pd.DataFrame({"Date": pd.Series(dtype='datetime64[ns]'), "Headline": pd.Series(dtype=object)})
+        return pd.concat(headlines, ignore_index=True)
     
     def scrape_analyst(self):
+        # scrape analyst reccomendations from yahoo finance
+        with self.span('scrape_analyst'):
+            if self.scraper == 'http':
+                df = self.http_scraper.analysts(self.ticker)
+            else:
+                df = self.browse_analyst()
+
+        df.Recommendation = df.Recommendation.str.strip()
+        self.text_store.append('analysts', self.ticker, df)
+
+        self.analyst = df
+        return self.analyst
+
+    def browse_analyst(self):
         # scrape analyst reccomendations from yahoo finance's webpage
-        self.analyst = [["Change","Analyst","Recommendation","Date"]]
+        analyst = [["Change","Analyst","Recommendation","Date"]]
 
         url = ANALYST_URL.format(self.ticker, self.ticker)
 
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
-        driver.get(url)
-
-        attempt = 0
-        while attempt < 20:
-            try:
-                time.sleep(0.25)
-                attempt1 = 0
-                while attempt1 < 3:
-                    try:
-                        time.sleep(0.25)
-                        close_popup = driver.find_element(by=By.XPATH, value= '//*[@id="myLightboxContainer"]/section/button[1]')
-                        driver.execute_script("arguments[0].click();", close_popup)
-                        break
-                            
-                    except:
-                        attempt1 += 1
+        with self.browser_pool.session() as driver:
+            def open_table():
+                driver.get(url)
+
+                # the cookie/consent popup doesn't always show up, so only give it a moment
+                try:
+                    click(driver, wait_for(driver, ANALYST_POPUP, timeout=POPUP_TIMEOUT,
+                                           condition=EC.element_to_be_clickable))
+                except TimeoutException:
+                    pass
 
                 # scroll to the bottem because the site is picky
                 driver.execute_script("window.scrollTo(0,document.body.scrollHeight)")
 
                 # get the open tab button, scroll to it, and click it
-                open_tab_button = driver.find_element(by=By.XPATH, value='//*[@id="Col2-6-QuoteModule-Proxy"]/div/section/button')
-                driver.execute_script("arguments[0].scrollIntoView(true);",open_tab_button)
-                driver.execute_script("arguments[0].click();", open_tab_button)
-                
+                click(driver, wait_for(driver, ANALYST_BUTTON, condition=EC.element_to_be_clickable))
+                return wait_for(driver, ANALYST_TABLE + '/tr', condition=EC.presence_of_all_elements_located)
 
-                break
+            recommendation = retry(open_table, "loading {} analyst recommendations".format(self.ticker))
 
-            except:
-                attempt += 1
-
-        
-        attempt = 0
-        while attempt < 20:
-            try:
-                time.sleep(0.5)
-                table_body = driver.find_element(by=By.XPATH, value='//*[@id="Col2-6-QuoteModule-Proxy"]/div/section/table/tbody')
-                recommendation = table_body.find_elements(by=By.TAG_NAME, value="tr")
-                break
+            for i in recommendation:
+                to_append = []
+                element = i.find_elements(by=By.TAG_NAME, value="td")
+                to_append.append(element[1].text)
 
-            except:
-                attempt += 1
+                element_company_rec = element[2].text.split(":")
+                to_append.append(element_company_rec[0])
+                to_append.append(element_company_rec[1])
 
-        for i in recommendation:
-            to_append = []
-            element = i.find_elements(by=By.TAG_NAME, value="td")
-            to_append.append(element[1].text)
+                to_append.append(element[3].text)
 
-            element_company_rec = element[2].text.split(":")
-            to_append.append(element_company_rec[0])
-            to_append.append(element_company_rec[1])
-
-            to_append.append(element[3].text)
-
-            self.analyst.append(to_append)
+                analyst.append(to_append)
         
-        df = pd.DataFrame(self.analyst[1:], columns=self.analyst[0])
-        df.Recommendation = df.Recommendation.str.strip()
-        df.to_csv("analysts/{}.csv".format(self.ticker), index=False)
-
-        self.analyst = df
-        return self.analyst
+        return pd.DataFrame(analyst[1:], columns=analyst[0])
     
 ############### END of Scraping Functions ###############################
 
 ############### Run Analysis on Stuff to get Bounds ###############################
+    def load_stored(self, table, scrape):
+        # a table for this ticker from the store (dates already typed). the first time, the old
+        # <table>/<ticker>.csv is imported if there is one, otherwise it gets scraped.
+        # returns (rows, rows from the csv whose dates couldn't be parsed)
+        unparsed = pd.DataFrame()
+        if self.text_store.load(table, self.ticker) is None:
+            legacy_file = "{}/{}.csv".format(table, self.ticker)
+            if os.path.isfile(legacy_file):
+                _, unparsed = self.text_store.import_csv(table, self.ticker, legacy_file)
+                print("Imported {} into the store".format(legacy_file))
+                if len(unparsed):
+                    print("Dropped {} rows with dates that couldn't be parsed".format(len(unparsed)))
+            else:
+                scrape()
+        return self.text_store.load(table, self.ticker), unparsed
+
     def sentiment_analysis(self):
         # check if headlines have been scraped
-        try:
-            self.headlines = pd.read_csv("headlines/{}.csv".format(self.ticker), index_col=None)
-        except:
-            self.scrape_news(True)
-            self.headlines = pd.read_csv("headlines/{}.csv".format(self.ticker), index_col=None)
-
-        # convert the date into a datetime format/variable/type
-        self.headlines["Date"] = pd.to_datetime(self.headlines["Date"])
-        self.headlines["Sentiment"] = np.nan
-        sentiment = []
-
-        # iterate through all of the headlines and score them
-        for index, row in self.headlines.iterrows():
-            sid = SentimentIntensityAnalyzer()
-            ss = sid.polarity_scores(row["Headline"])
-            sentiment.append(ss["compound"])
-        
-        self.headlines["Sentiment"] = sentiment
+        self.headlines, self.data['Headlines']['Unparsed'] = self.load_stored('headlines', self.scrape_news)
+
+        # score all of the headlines in batches with a single loaded lexicon
+        if self.dedup_headlines:
+            # one representative per cluster of near duplicates gets scored and every copy shares
+            # its score. Weight is how many headlines the cluster has
+            with self.span('dedup_headlines'):
+                self.headlines = collapse_headlines(self.headlines)
+            representative = self.headlines['Representative'].to_numpy()
+            with self.span('score_headlines'):
+                scores = np.zeros(len(self.headlines))
+                scores[representative] = self.sentiment_engine.score(self.headlines["Headline"][representative])
+                self.headlines["Sentiment"] = scores[self.headlines['Cluster'].to_numpy()]
+            counted = self.headlines[representative]
+        else:
+            with self.span('score_headlines'):
+                self.headlines["Sentiment"] = self.sentiment_engine.score(self.headlines["Headline"])
+            counted = self.headlines
         
         self.data['Headlines']['Best_Headline'] = self.headlines[
             self.headlines.Sentiment == self.headlines.Sentiment.max()
@@ -365,108 +485,84 @@ class Stock:
             self.headlines.Sentiment == self.headlines.Sentiment.min()
         ]
 
-        # group the headlines by date and then take the mean to find average score per day
-        self.sentiment = self.headlines[["Date","Sentiment"]]
-        self.sentiment = self.sentiment.groupby("Date").mean()
-        
-        self.sentiment.index = pd.to_datetime(self.sentiment.index)
-        self.sentiment["Value"] = 0
-        
-        self.sentiment.loc[self.sentiment['Sentiment'] > 0, 'Value'] = 1
-        self.sentiment.loc[self.sentiment['Sentiment'] < 0, 'Value'] = -1
-        
-        self.sentiment = pd.merge(self.sentiment, self.price_history[['High','Low','Close']], how='outer', left_index=True, right_index=True)
-        self.sentiment.Value.iloc[0] = -999
-        self.sentiment.Value = self.sentiment.Value.fillna(method='ffill')
+        # average score of the headlines each bar could trade on (a cluster counts once), carried forward
+        self.sentiment = self.align_signal(counted['Date'], counted['Sentiment'], 'Sentiment')
+
+        if self.lean:
+            # every headline has been boiled down to the bar values and the best/worst ones
+            self.headlines = None
         
         return self.sentiment
 
     def analyst_recommendation(self):
-        try:
-            self.analyst = pd.read_csv("analysts/{}.csv".format(self.ticker), index_col=None)
-
-        except:
-            self.scrape_analyst()
-
-        self.analyst["Date"] = pd.to_datetime(self.analyst["Date"])
-        self.analyst["Value"] = 0
-        
-        # quantify recommendations
-        # maintaining
-        self.analyst.loc[self.analyst["Recommendation"] == 'to Buy', 'Value'] = 1
-        self.analyst.loc[self.analyst["Recommendation"] == 'to Outperform', 'Value'] = 1
-        self.analyst.loc[self.analyst["Recommendation"] == 'to Overweight', 'Value'] = 1     
-        
-        self.analyst.loc[self.analyst["Recommendation"] == 'to Sell', 'Value'] = -1
-        self.analyst.loc[self.analyst["Recommendation"] == 'to Underperform', 'Value'] = -1
-        self.analyst.loc[self.analyst["Recommendation"] == 'to Underweight', 'Value'] = -1
-        
-        # change to 1
-        self.analyst.loc[self.analyst["Recommendation"] == 'Hold to Buy', 'Value'] = 1
-        self.analyst.loc[self.analyst["Recommendation"] == 'Peer Perform to Outperform', 'Value'] = 1
-        self.analyst.loc[self.analyst["Recommendation"] == 'Neutral to Overweight', 'Value'] = 1
-        self.analyst.loc[self.analyst["Recommendation"] == 'Equal-Weight to Overweight', 'Value'] = 1
-        
-        # change to 0
-        self.analyst.loc[self.analyst["Recommendation"] == 'Buy to Hold', 'Value'] = 0
-        self.analyst.loc[self.analyst["Recommendation"] == 'Outperform to Peer Perform', 'Value'] = 0
-        self.analyst.loc[self.analyst["Recommendation"] == 'Overweight to Neutral', 'Value'] = 0
-        self.analyst.loc[self.analyst["Recommendation"] == 'Overweight to Equal-Weight', 'Value'] = 0
-        
-        self.analyst.loc[self.analyst["Recommendation"] == 'Sell to Hold', 'Value'] = 0
-        self.analyst.loc[self.analyst["Recommendation"] == 'Underperform to Peer Perform', 'Value'] = 0
-        self.analyst.loc[self.analyst["Recommendation"] == 'Underweight to Neutral', 'Value'] = 0
-        self.analyst.loc[self.analyst["Recommendation"] == 'Underweight to Equal-Weight', 'Value'] = 0
-        
-        # change to -1
-        self.analyst.loc[self.analyst["Recommendation"] == 'Hold to Sell', 'Value'] = -1
-        self.analyst.loc[self.analyst["Recommendation"] == 'Peer Perform to Underperform', 'Value'] = -1
-        self.analyst.loc[self.analyst["Recommendation"] == 'Neutral to Underweight', 'Value'] = -1
-        self.analyst.loc[self.analyst["Recommendation"] == 'Equal-Weight to Underweight', 'Value'] = -1
-        
-        self.analyst_stripped = self.analyst[['Date','Value']]
-        self.analyst_stripped = self.analyst_stripped.groupby('Date').mean()
-        self.analyst_stripped.loc[self.analyst_stripped.Value < 0, 'Value'] = -1
-        self.analyst_stripped.loc[self.analyst_stripped.Value > 0, 'Value'] = 1
-        
-        self.analyst_stripped = pd.merge(self.analyst_stripped, self.price_history[['High','Low','Close']], how='outer', left_index=True, right_index=True)
-        self.analyst_stripped.Value.iloc[0] = -999
-        self.analyst_stripped.Value = self.analyst_stripped.Value.fillna(method='ffill')
-        
-        self.analyst_stripped['Value'] = pd.to_numeric(self.analyst_stripped['Value'], downcast='integer')
+        self.analyst, self.data['Analysts']['Unparsed'] = self.load_stored('analysts', self.scrape_analyst)
+
+        # quantify recommendations with the rules table (analyst_rules.json by default)
+        self.analyst["Value"], unmapped = encode_recommendations(self.analyst["Recommendation"], self.analyst_rules)
+        self.data['Analysts']['Unmapped'] = unmapped
+        if len(unmapped):
+            print("{} analyst recommendations had no rule and were set to {}: {}".format(
+                unmapped.sum(), self.analyst_rules["default"], ", ".join(unmapped.index[:10])
+            ))
+        
+        self.analyst_stripped = self.align_signal(self.analyst['Date'], self.analyst['Value'])
+
+        if self.lean:
+            # the raw recommendations aren't used past this point
+            self.analyst = None
 
         return self.analyst_stripped
 
+    def align_signal(self, timestamps, scores, score_name=None):
+        # events (headlines, recommendations) on the price bars: each one lands on the first bar it
+        # could be traded on, every bar takes the mean of the latest bar with events (up to
+        # max_staleness bars back) and Value is its sign, -999 while nothing is known
+        aligned = self.calendar.align(timestamps, scores, self.max_staleness)
+        signal = pd.DataFrame(index=self.price_history.index)
+        if score_name is not None:
+            signal[score_name] = aligned.to_numpy()
+        signal['Value'] = band(aligned).to_numpy()
+        if not self.lean:
+            # the prices used to come along with the outer merge, same index so they just slot in
+            for column in ['High', 'Low', 'Close']:
+                signal[column] = self.price_history[column].to_numpy()
+        return signal
+
 ############### END of Analysis ###############################
 
 ############### Consider Updating over rescraping ###############################
     
     def update_headlines(self):
         # update the headlines without needing to rescrape the whole thing
-        try:
-            self.headlines = pd.read_csv("headlines/{}.csv".format(self.ticker), index_col=None)
-        except:
+        stored, _ = self.load_stored('headlines', lambda: None)
+        if stored is None:
             print('No local data to update')
             self.scrape_news(True)
-            self.headlines = pd.read_csv("headlines/{}.csv".format(self.ticker), index_col=None)
-        
-        
-            
+            self.headlines = self.text_store.load('headlines', self.ticker)
+            return self.headlines
 
-            
-        pass
+        # only scrape tabs until we reach headlines we already have (matched on date and text)
+        known = set(zip(stored["Date"], stored["Headline"]))
+        new_headlines = self.scrape_news(save=False, stop_at=known)
+
+        # the store puts the new ones on top, same order as a full scrape
+        added = self.text_store.append('headlines', self.ticker, new_headlines)
+        print("Found {} new headlines for {}".format(len(added), self.ticker))
+
+        self.headlines = self.text_store.load('headlines', self.ticker)
+        return self.headlines
 
 ############### Accuracy Functions (Pretty much plotting) ###############################
 
     def headline_accuracy(self):
         # check headline accuracy
-        self.subplot_total(
+        self.figures['headline_total'] = self.subplot_total(
             self.sentiment, 'Value',[-1,1,-999],[0.7,0.7,0.25],['r','g','grey'],
             'figs/{}/headline_accuracy_{}.png'.format(self.ticker,self.ticker),
             'Headline Analysis for {}'.format(self.ticker)
         )
         
-        self.subplot_years(
+        self.figures['headline_years'] = self.subplot_years(
             self.sentiment, 'Value',[-1,1,-999],[0.7,0.7,0.25],['r','g','grey'],
             'figs/{}/headline_accuracy_years_{}.png'.format(self.ticker,self.ticker),
             'Annual Headline Analysis for {}'.format(self.ticker)
@@ -485,12 +581,12 @@ class Stock:
         
         #############################
         # RSI
-        self.subplot_total(
+        self.figures['RSI_total'] = self.subplot_total(
             self.rsi, 'bounds',[-1,1],[0.7,0.7],['r','g'],
             'figs/{}/RSI_accuracy_{}.png'.format(self.ticker,self.ticker),
             'RSI Analysis for {}'.format(self.ticker)
         )
-        self.subplot_years(
+        self.figures['RSI_years'] = self.subplot_years(
             self.rsi, 'bounds',[-1,1],[0.7,0.7],['r','g'],
             'figs/{}/RSI_accuracy_years_{}.png'.format(self.ticker,self.ticker),
             'Annual RSI Analysis for {}'.format(self.ticker)
@@ -506,13 +602,13 @@ class Stock:
         
         #############################
         # OBV
-        self.subplot_total(
+        self.figures['OBV_total'] = self.subplot_total(
             self.obv, 'bounds',[-1,1],[0.7,0.7],['r','g'],
             'figs/{}/OBV_accuracy_{}.png'.format(self.ticker,self.ticker),
             'OBV Analysis for {}'.format(self.ticker)
         )
         
-        self.subplot_years(
+        self.figures['OBV_years'] = self.subplot_years(
             self.obv, 'bounds',[-1,1],[0.7,0.7],['r','g'],
             'figs/{}/OBV_accuracy_years_{}.png'.format(self.ticker,self.ticker),
             'Annual OBV Analysis for {}'.format(self.ticker)
@@ -527,13 +623,13 @@ class Stock:
         
         #############################
         # ADX
-        self.subplot_total(
+        self.figures['ADX_total'] = self.subplot_total(
             self.adx, 'bounds',[-3,-2,-1,1,2,3],[0.8,0.6,0.4,0.4,0.6,0.8],['r','r','r','g','g','g'],
             'figs/{}/ADX_accuracy_{}.png'.format(self.ticker,self.ticker),
             'ADX Analysis for {}'.format(self.ticker)
         )
         
-        self.subplot_years(
+        self.figures['ADX_years'] = self.subplot_years(
             self.adx, 'bounds',[-3,-2,-1,1,2,3],[0.8,0.6,0.4,0.4,0.6,0.8],['r','r','r','g','g','g'],
             'figs/{}/ADX_accuracy_years_{}.png'.format(self.ticker,self.ticker),
             'Annual ADX Analysis for {}'.format(self.ticker)
@@ -556,13 +652,13 @@ class Stock:
 
     def analyst_accuracy(self):
         # check analyst accuracy
-        self.subplot_total(
+        self.figures['analyst_total'] = self.subplot_total(
             self.analyst_stripped, 'Value',[-1,1,-999],[0.7,0.7,0.25],['r','g','grey'],
             'figs/{}/analyst_accuracy_{}.png'.format(self.ticker,self.ticker),
             'Analyst Analysis for {}'.format(self.ticker)
         )
         
-        self.subplot_years(
+        self.figures['analyst_years'] = self.subplot_years(
             self.analyst_stripped, 'Value',[-1,1,-999],[0.7,0.7,0.25],['r','g','grey'],
             'figs/{}/analyst_accuracy_years_{}.png'.format(self.ticker,self.ticker),
             'Annual Analyst Analysis for {}'.format(self.ticker)
@@ -579,155 +675,90 @@ class Stock:
 ############### END of Accuracy Functions ###############################   
 
     def subplot_years(self, df, bounds_name, bounds_values, alpha_values, color, name, title):
-        beginning = df.index[0].year
-        end = df.index[-1].year
-        
-        # capped to fit on a word page
-        total_rows = 10
-        
-        columns = int(round(((end-beginning)/total_rows)+0.5))
-        rows = int(round(((end-beginning)/columns)+0.5))
-        fig, ax = plt.subplots(rows,columns)
-        if (end-beginning) < total_rows:
-            for year in range(end-beginning):
-                ax[year].plot(self.price_history[self.market_time].loc[str(year+beginning):str(year+beginning)])
-                df_slice = df[str(year+beginning):str(year+beginning)]
-                inxval = mdates.date2num(df_slice.index.to_pydatetime())
-                for num in range(len(bounds_values)):
-                    collection = collections.BrokenBarHCollection.span_where(
-                        inxval, 0,
-                        self.price_history.High.loc[str(year+beginning):str(year+beginning)].max(), df_slice[bounds_name] == bounds_values[num],
-                        facecolor=color[num], alpha=alpha_values[num]
-                    )
-                    ax[year].add_collection(collection)
-                    ax[year].tick_params(labelrotation=45)
-                    
-        else:
-            count = 0
-            for col in range(columns):
-                for r in range(rows):
-                    ax[r][col].plot(self.price_history[self.market_time].loc[str(count+beginning):str(count+beginning)])
-                    df_slice = df[str(count+beginning):str(count+beginning)]
-                    inxval = mdates.date2num(df_slice.index.to_pydatetime())
-                    for num in range(len(bounds_values)):
-                        collection = collections.BrokenBarHCollection.span_where(
-                            inxval, 0,
-                            self.price_history.High.loc[str(count+beginning):str(count+beginning)].max(), df_slice[bounds_name] == bounds_values[num],
-                            facecolor=color[num], alpha=alpha_values[num]
-                        )
-                        ax[r][col].add_collection(collection)
-                        ax[r][col].tick_params(labelrotation=45)
-                    count += 1
-                    if count >(end-beginning):
-                        break
-        
-        if columns == 1:
-            fig.set_size_inches(6.5,(end-beginning))
-        else:
-            fig.set_size_inches(6.5,1.5*(end-beginning)/columns)
-        fig.set_dpi(DPI*columns)
-        fig.suptitle(title)
-        fig.tight_layout(pad=1)
-        plt.close(fig)
-        fig.savefig(name)
-        # fig.show()
+        # shade from runs of the signal rather than rescanning the daily mask for every bound
+        runs = to_runs(df[bounds_name])
+        return self.renderer.submit(
+            render_years, name, self.price_history[self.market_time], self.price_history.High,
+            df.index, runs, bounds_values, alpha_values, color, title
+        )
             
     def subplot_total(self, df, bounds_name, bounds_values, 
                       alpha_values, color, name, title):
-        fig, ax = plt.subplots()
-        inxval = mdates.date2num(df.index.to_pydatetime())
-        ax.plot(self.price_history[self.market_time])
-        for num in range(len(bounds_values)):
-            collection = collections.BrokenBarHCollection.span_where(
-                            inxval, 0,
-                            self.price_history.High.max(), df[bounds_name] == bounds_values[num],
-                            facecolor=color[num], alpha=alpha_values[num]
-            )
-            ax.add_collection(collection)
-        
-        fig.set_dpi(DPI)
-        fig.suptitle(title)
-        fig.tight_layout(pad=1)
-        plt.close(fig)
-        fig.savefig(name)
-        # fig.show()
-        
-    def plotting_shift(self, df, bounds_name, bounds_values,title,path):
-        df_temp = df[bounds_name]
-        df_temp = pd.merge(df_temp, self.price_history[['High','Low','Close']], how='outer', left_index=True, right_index=True)
-        df_temp = df_temp.dropna()
-        for days in periods:
-            df_temp['{}-day'.format(days)] = df_temp[self.market_time].shift(-days) - df_temp[self.market_time]
-        df_temp = df_temp.dropna()
-        to_return = {}
-        for i in range(len(bounds_values)):
-            fig, ax = plt.subplots(sharex=True)
-            fig.tight_layout()
-            fig.set_size_inches(6.5,9)
-            fig.set_dpi(DPI*2)
-            df_temp[['1-day','3-day','7-day','14-day','21-day','28-day']].loc[
-                df_temp[bounds_name]==bounds_values[i]].plot(
-                kind='line',
-                subplots=True,
-                lw=0.5,
-                title=title[i],
-                legend=True,
-                ax=ax
-            )
-            plt.close(fig)
-            fig.savefig(path[i])
-            
-            to_return[str(bounds_values[i])+'_mean'] = df_temp[['1-day','3-day','7-day','14-day','21-day','28-day']].loc[
-                df_temp[bounds_name]==bounds_values[i]].mean()
-            to_return[str(bounds_values[i])+'_min'] = df_temp[['1-day','3-day','7-day','14-day','21-day','28-day']].loc[
-                df_temp[bounds_name]==bounds_values[i]].min()
-            to_return[str(bounds_values[i])+'_max'] = df_temp[['1-day','3-day','7-day','14-day','21-day','28-day']].loc[
-                df_temp[bounds_name]==bounds_values[i]].max()
-            
+        runs = to_runs(df[bounds_name])
+        return self.renderer.submit(
+            render_total, name, self.price_history[self.market_time], self.price_history.High,
+            runs, bounds_values, alpha_values, color, title
+        )
+        
+    def plotting_shift(self, df, bounds_name, bounds_values,title,path,horizons=periods):
+        # forward returns and their stats for every bound are computed once up front
+        df_temp = forward_return_frame(
+            df[bounds_name], self.price_history, horizons, self.market_time, keep_prices=not self.lean
+        )
+        stats = forward_return_stats(df_temp, horizons, bounds_values)
+        columns = [horizon_column(days) for days in horizons]
+
+        if self.renderer.enabled:
+            for i in range(len(bounds_values)):
+                self.renderer.submit(
+                    render_shift, path[i], df_temp[columns].loc[df_temp['Bound']==bounds_values[i]], title[i]
+                )
+
+        # keep the old {bound}_mean/_min/_max layout for the report and the full table under 'stats'
+        # (lean mode only keeps what the report reads)
+        to_return = stats_by_bound(stats, bounds_values)
+        if not self.lean:
+            to_return['stats'] = stats
         return to_return
+
+    def memory_footprint(self):
+        # MB held by each attribute (frames, series, self.data...), largest first. in lean mode
+        # price_history_lower is a view of price_history so it isn't counted twice
+        sizes = pd.Series({
+            name: footprint(value) / 1024 / 1024 for name, value in self.__dict__.items()
+            if not (self.lean and name == 'price_history_lower')
+        }, dtype=float)
+        return sizes[sizes > 0].sort_values(ascending=False)
     
     def unwrap_data(self, document, bounds, group, subgroup):
-        num_rows = len(bounds)*3
-        unpacked_data = [self.data[group][subgroup]['{}_min'.format(bounds[0])].index.tolist()]
-        table = document.add_table(1,num_rows+1)
-        table.style = 'LightShading-Accent1'
-        heading_cells = table.rows[0].cells
-        heading_cells[0].text = 'Timeframe'
-        for i in range(len(bounds)):
-            heading_cells[int(i*3+1)].text = '{}_min'.format(bounds[i])
-            heading_cells[int(i*3+2)].text = '{}_mean'.format(bounds[i])
-            heading_cells[int(i*3+3)].text = '{}_max'.format(bounds[i])
-            
-            unpacked_data.append(self.data[group][subgroup]['{}_min'.format(bounds[i])].tolist())
-            unpacked_data.append(self.data[group][subgroup]['{}_mean'.format(bounds[i])].tolist())
-            unpacked_data.append(self.data[group][subgroup]['{}_max'.format(bounds[i])].tolist())
-        
-        for i in range(len(unpacked_data[0])):
-            cells = table.add_row().cells
-            for j in range(len(unpacked_data)):
-                if type(unpacked_data[j][i]) == str:
-                    cells[j].text = unpacked_data[j][i]
-                else:
-                    try:
-                        cells[j].text = str(round(unpacked_data[j][i],2))
-                    except:
-                        cells[j].text = 'NaN'
-                
-        return table
-        
-        
+        return add_stats_table(document, self.data[group][subgroup], bounds)
     
 ############### Generate Report ###############################
 
     def generate_report(self):
         # generate a report of the data
+        if self.stats_only:
+            print('Skipping the report in stats only mode')
+            return None
+
+        # the report embeds the figures so they all have to be written first
+        with self.span('render_wait'):
+            self.renderer.wait()
+        if self.renderer.fig_format == 'svg':
+            print('Skipping the report, it can only embed raster figures')
+            return None
+
+        # nothing to do if the figures, stats and report code are all the same as last time
+        report_path = 'reports/{}.docx'.format(self.ticker)
+        if self.artifacts is not None:
+            report_fingerprint = fingerprint(
+                type(self).generate_report, type(self).unwrap_data, REPORT_MODULES, REPORT_DPI, docx.__version__,
+                self.renderer.fingerprints, self.data
+            )
+            reusable, reason = self.artifacts.check(report_path, report_fingerprint)
+            if reusable:
+                self.artifacts.reuse(report_path)
+                self.artifacts.save()
+                print('Report for {} is up to date ({})'.format(self.ticker, self.artifacts.summary()))
+                return report_path
+
         document = docx.Document()
         document.add_heading('Automatice Report for {}'.format(self.ticker), 0)
         
         # Begin by talking about headline stuff
         document.add_heading('Analyzing the Headline Accuracy', 1)
-        document.add_picture('figs/{}/Headline_accuracy_{}.png'.format(self.ticker,self.ticker))
-        document.add_picture('figs/{}/Headline_accuracy_years_{}.png'.format(self.ticker,self.ticker),height=Inches(9))
+        add_figure(document, self.figures['headline_total'])
+        add_figure(document, self.figures['headline_years'], height=9)
         
         document.add_heading('')
         
@@ -754,40 +785,44 @@ class Stock:
         # Next start talking about Technical Indicator stuff
         document.add_heading('Analyzing the Technical Indicators', 1)
         document.add_heading('Looking at RSI', 2)
-        document.add_picture('figs/{}/RSI_accuracy_{}.png'.format(self.ticker,self.ticker))
-        document.add_picture('figs/{}/RSI_accuracy_years_{}.png'.format(self.ticker,self.ticker),height=Inches(9))
+        add_figure(document, self.figures['RSI_total'])
+        add_figure(document, self.figures['RSI_years'], height=9)
         
         self.unwrap_data(document,[-1,1],'TA','RSI')
         
         document.add_heading('Looking at OBV', 2)
-        document.add_picture('figs/{}/OBV_accuracy_{}.png'.format(self.ticker,self.ticker))
-        document.add_picture('figs/{}/OBV_accuracy_years_{}.png'.format(self.ticker,self.ticker),height=Inches(9))
+        add_figure(document, self.figures['OBV_total'])
+        add_figure(document, self.figures['OBV_years'], height=9)
         self.unwrap_data(document,[-1,1],'TA','OBV')
         
         document.add_heading('Looking at ADX', 2)
-        document.add_picture('figs/{}/ADX_accuracy_{}.png'.format(self.ticker,self.ticker))
-        document.add_picture('figs/{}/ADX_accuracy_years_{}.png'.format(self.ticker,self.ticker),height=Inches(9))
+        add_figure(document, self.figures['ADX_total'])
+        add_figure(document, self.figures['ADX_years'], height=9)
         self.unwrap_data(document,[-2,-1,1,2],'TA','ADX')
         
         document.add_page_break()
         
         # Finally end by talking about Analyst Agency stuff
         document.add_heading('Analyzing the Analyst Agencies', 1)
-        document.add_picture('figs/{}/analyst_accuracy_{}.png'.format(self.ticker,self.ticker))
-        document.add_picture('figs/{}/analyst_accuracy_years_{}.png'.format(self.ticker,self.ticker),height=Inches(9))
+        add_figure(document, self.figures['analyst_total'])
+        add_figure(document, self.figures['analyst_years'], height=9)
         self.unwrap_data(document,[-1,1],'Analysts','Analysis')
         
         
         # Save the document
-        document.save('reports/{}.docx'.format(self.ticker))
+        document.save(report_path)
+
+        if self.artifacts is not None:
+            self.artifacts.record(report_path, report_fingerprint, reason)
+            self.artifacts.save()
+            print(self.artifacts.summary())
+        return report_path
 
 # %%
 
 if __name__ == "__main__":
     www = Stock('www')
-    # for s in TICKER_LIST:
-    #     t = Stock(s)
-        
-    #     # delete variable otherwise computer dies
-    #     del t
-    #     gc.collect()
\ No newline at end of file
+
+    # to run all of TICKER_LIST use the batch runner instead, it runs every ticker
+    # in its own recycled worker process so memory doesn't pile up:
+    #     python batch.py --workers 4
\ No newline at end of file
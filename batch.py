@@ -0,0 +1,281 @@
+import argparse
+import multiprocessing.util
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from render import RENDER_FORMATS
+
+from metrics import rss_mb, reset_rss_peak, rss_high_water_mb
+
+
+# where the per-ticker results get written
+SUMMARY_PATH = "reports/batch_summary.csv"
+
+# PeakMemoryOf says whether PeakMemoryMB is the ticker's own peak or the peak of the worker
+# over every ticker it has run (a reused worker where the high-water mark can't be reset)
+SUMMARY_COLUMNS = ["Ticker", "Status", "Seconds", "PeakMemoryMB", "PeakMemoryOf", "FootprintMB", "PID", "Error"]
+
+# seconds between a worker's checks of its resident size
+MEMORY_POLL = 0.2
+
+# per worker process: the highest resident size sampled during the current ticker, and how
+# many tickers the worker has run
+_ticker_peak_mb = 0.0
+_tickers_run = 0
+
+
+def _init_worker(memory_limit_mb):
+    # figures are only saved to disk so never try to open a window from a worker
+    import matplotlib
+    matplotlib.use("Agg")
+
+    # tickers run in the same worker share its browser. pool workers leave with os._exit,
+    # which skips atexit, so quit the browser from a multiprocessing finalizer instead
+    from browser import close_shared_pool
+    multiprocessing.util.Finalize(None, close_shared_pool, exitpriority=10)
+
+    threading.Thread(target=_watch_memory, args=(memory_limit_mb,), daemon=True).start()
+
+
+def _watch_memory(memory_limit_mb):
+    # samples the worker's resident size for the ticker's peak and stops a runaway worker before
+    # it takes the machine down. the cap is on resident memory of the worker alone: an address
+    # space cap (RLIMIT_AS) is inherited by chromedriver/chrome, which reserve far more than they
+    # use, so browser scraping couldn't run under one. a stopped worker's ticker is recorded as
+    # failed like any other dead worker's
+    global _ticker_peak_mb
+    from browser import close_shared_pool
+
+    while True:
+        rss = rss_mb()
+        _ticker_peak_mb = max(_ticker_peak_mb, rss)
+        if memory_limit_mb and rss > memory_limit_mb:
+            print("Worker {} is using {:.0f} MB, over the {:.0f} MB limit, stopping it".format(
+                os.getpid(), rss, memory_limit_mb), flush=True)
+            try:
+                close_shared_pool()
+            finally:
+                os._exit(1)
+        time.sleep(MEMORY_POLL)
+
+
+def run_ticker(ticker, stock_kwargs=None):
+    # build one Stock and report how it went. Never raises so one bad ticker can't kill the batch
+    global _ticker_peak_mb, _tickers_run
+    from base import Stock
+
+    stock_kwargs = dict(stock_kwargs or {})
+    # the batch already spreads tickers over the cores (and pool workers can't start their own pools)
+    stock_kwargs.setdefault("sentiment_workers", 1)
+    stock_kwargs.setdefault("render_workers", 1)
+
+    # the peak is the ticker's own where the high-water mark can be reset (linux) or on a new worker
+    _tickers_run += 1
+    own_peak = reset_rss_peak() or _tickers_run == 1
+    _ticker_peak_mb = rss_mb()
+
+    start = time.time()
+    result = {"Ticker": ticker, "Status": "ok", "Error": "", "PID": os.getpid(), "FootprintMB": float("nan")}
+    try:
+        stock = Stock(ticker, **stock_kwargs)
+        result["FootprintMB"] = round(stock.memory_footprint().sum(), 1)
+        del stock
+    except BaseException as e:
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        result["Status"] = "failed"
+        result["Error"] = "{}: {}".format(type(e).__name__, e)
+        traceback.print_exc()
+
+    result["Seconds"] = round(time.time() - start, 2)
+    # an instrumented Stock resets the high-water mark for every stage, the sampled peak covers
+    # the stages before the last reset
+    result["PeakMemoryMB"] = round(max(rss_high_water_mb(), _ticker_peak_mb), 1)
+    result["PeakMemoryOf"] = "ticker" if own_peak else "worker"
+    return result
+
+
+def _failed(ticker, error, seconds=float("nan")):
+    # the result of a ticker that never got to report one itself
+    return {
+        "Ticker": ticker, "Status": "failed", "Error": error, "PID": float("nan"), "FootprintMB": float("nan"),
+        "Seconds": seconds, "PeakMemoryMB": float("nan"), "PeakMemoryOf": "",
+    }
+
+
+def _executor(workers, memory_limit_mb, max_tasks_per_worker):
+    # max_tasks_per_child is only there from python 3.11 on
+    recycle = {"max_tasks_per_child": max_tasks_per_worker} if max_tasks_per_worker else {}
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(memory_limit_mb,),
+        **recycle
+    )
+
+
+def _run_alone(ticker, stock_kwargs, memory_limit_mb):
+    # one ticker in a worker of its own, so if the worker dies we know it was this ticker
+    start = time.time()
+    with _executor(1, memory_limit_mb, None) as pool:
+        try:
+            return pool.submit(run_ticker, ticker, stock_kwargs).result()
+        except BrokenProcessPool:
+            return _failed(
+                ticker, "worker died (memory limit or a crash in native code)", round(time.time() - start, 2)
+            )
+
+
+def _run_pool(tickers, workers, max_tasks_per_worker, memory_limit_mb, stock_kwargs):
+    # yields every ticker's result as it finishes. a worker killed by the memory limit or a segfault
+    # breaks the whole pool and takes the tickers that were running with it down too, so those
+    # are run again one at a time to find the one that did it, then the rest go on in a new pool
+    pending = list(tickers)
+    while pending:
+        suspects = []
+        with _executor(workers, memory_limit_mb, max_tasks_per_worker) as pool:
+            # only as many tickers as workers are handed out at a time, so a broken pool
+            # only leaves the ones that were actually running unaccounted for
+            running = {}
+            while (pending or running) and not suspects:
+                while pending and len(running) < workers:
+                    ticker = pending.pop(0)
+                    running[pool.submit(run_ticker, ticker, stock_kwargs)] = ticker
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ticker = running.pop(future)
+                    try:
+                        yield future.result()
+                    except BrokenProcessPool:
+                        suspects.append(ticker)
+            suspects.extend(running.values())
+
+        if suspects:
+            print("A worker died while running {}, running them again one at a time".format(", ".join(suspects)))
+            for ticker in suspects:
+                yield _run_alone(ticker, stock_kwargs, memory_limit_mb)
+
+
+def prefetch_http(tickers, http_scraper=None, text_store=None):
+    # fetch headlines/analysts for every ticker that has none stored in one concurrent run,
+    # so the workers find them in the store instead of each scraping on its own.
+    # what worked is stored, returns {ticker: error} for the tickers that couldn't be fetched
+    from http_backend import HttpScraper
+    from store import TextStore
+
+    http_scraper = http_scraper if http_scraper is not None else HttpScraper()
+    text_store = text_store if text_store is not None else TextStore()
+
+    failed = {}
+    for table, fetch in (("headlines", http_scraper.news), ("analysts", http_scraper.analysts)):
+        # tickers that still only have an old csv get imported by Stock instead
+        stored = set(text_store.tickers(table))
+        missing = [t for t in tickers if t not in stored and not os.path.isfile("{}/{}.csv".format(table, t))]
+        if missing:
+            print("Fetching {} for {} tickers".format(table, len(missing)))
+            frames, failures = fetch(missing)
+            for ticker, df in frames.items():
+                text_store.append(table, ticker, df)
+            for ticker, e in failures.items():
+                error = "fetching {}: {}: {}".format(table, type(e).__name__, e)
+                failed[ticker] = "{}; {}".format(failed[ticker], error) if ticker in failed else error
+    if failed:
+        print("Couldn't fetch {} of {} tickers: {}".format(len(failed), len(tickers), ", ".join(failed)))
+    return failed
+
+
+def run_batch(tickers, workers=2, max_tasks_per_worker=1, memory_limit_mb=None,
+              summary_path=SUMMARY_PATH, stock_kwargs=None, failed=None):
+    # run every ticker over a pool of worker processes and write a success/failure summary.
+    # max_tasks_per_worker recycles a worker after that many tickers, which returns
+    # all of its memory to the os (None keeps workers alive for the whole batch). recycling
+    # needs python 3.11 or later, older pythons keep the workers for the whole batch.
+    # memory_limit_mb stops a worker whose own resident memory goes over it (browsers aside).
+    # a ticker whose worker dies (memory limit, segfault) is recorded as failed, as are the
+    # tickers in failed ({ticker: error} from before the batch, e.g. prefetch_http) without being run
+    tickers = list(tickers)
+    failed = failed or {}
+    if max_tasks_per_worker and sys.version_info < (3, 11):
+        print("Recycling workers needs python 3.11 or later, workers are kept for the whole batch")
+        max_tasks_per_worker = None
+    results = [_failed(ticker, failed[ticker]) for ticker in tickers if ticker in failed]
+    todo = [ticker for ticker in tickers if ticker not in failed]
+    workers = max(1, min(workers, len(todo))) if todo else 1
+    print("Running {} tickers on {} workers".format(len(todo), workers))
+
+    for result in _run_pool(todo, workers, max_tasks_per_worker, memory_limit_mb, stock_kwargs):
+        print("{}: {} in {}s".format(result["Ticker"], result["Status"], result["Seconds"]))
+        results.append(result)
+
+    # keep the summary in the order the tickers were asked for
+    order = {ticker: i for i, ticker in enumerate(tickers)}
+    results.sort(key=lambda r: order[r["Ticker"]])
+    summary = pd.DataFrame(results, columns=SUMMARY_COLUMNS)
+
+    if summary_path:
+        directory = os.path.dirname(summary_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        summary.to_csv(summary_path, index=False)
+        print("Wrote batch summary to {}".format(summary_path))
+
+    failed = summary[summary.Status != "ok"]
+    print("{} of {} tickers succeeded".format(len(summary) - len(failed), len(summary)))
+    return summary
+
+
+def main(argv=None):
+    from base import TICKER_LIST, SCRAPERS
+    from metrics import MEMORY_MODES
+
+    parser = argparse.ArgumentParser(description="Run the stock analysis for many tickers in parallel")
+    parser.add_argument("tickers", nargs="*", help="tickers to run, defaults to TICKER_LIST")
+    parser.add_argument("--workers", type=int, default=2, help="number of tickers processed at once")
+    parser.add_argument("--max-tasks-per-worker", type=int, default=1,
+                        help="recycle a worker process after this many tickers, 0 never recycles "
+                             "(python 3.11 or later)")
+    parser.add_argument("--memory-limit", type=float, default=None,
+                        help="per-worker resident memory cap in MB, a worker over it is stopped and its "
+                             "ticker recorded as failed. browser processes don't count towards it")
+    parser.add_argument("--summary", default=SUMMARY_PATH, help="csv file for the per-ticker summary")
+    parser.add_argument("--dpi", type=int, default=None, help="figure resolution, defaults to base.DPI")
+    parser.add_argument("--format", choices=RENDER_FORMATS, default="png", help="figure file format")
+    parser.add_argument("--stats-only", action="store_true", help="skip figures and reports")
+    parser.add_argument("--scraper", choices=SCRAPERS, default="browser",
+                        help="how missing headlines/analyst data is scraped")
+    parser.add_argument("--metrics", nargs="?", const="rss", choices=MEMORY_MODES, default=None,
+                        help="write per stage time/memory/rows for every ticker to reports/metrics, "
+                             "optionally saying how memory is measured")
+    parser.add_argument("--lean", action="store_true",
+                        help="compact dtypes and no duplicate copies, for fitting more workers in memory")
+    args = parser.parse_args(argv)
+
+    stock_kwargs = {
+        "fig_format": args.format, "stats_only": args.stats_only, "scraper": args.scraper,
+        "instrument": args.metrics or False, "lean": args.lean,
+    }
+    if args.dpi is not None:
+        stock_kwargs["dpi"] = args.dpi
+
+    tickers = args.tickers or TICKER_LIST
+    failed = prefetch_http(tickers) if args.scraper == "http" else {}
+
+    summary = run_batch(
+        tickers,
+        workers=args.workers,
+        max_tasks_per_worker=args.max_tasks_per_worker or None,
+        memory_limit_mb=args.memory_limit,
+        summary_path=args.summary,
+        stock_kwargs=stock_kwargs,
+        failed=failed
+    )
+    return 0 if (summary.Status == "ok").all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+
+# where results go unless --output says otherwise
+BENCH_PATH = "bench_results.json"
+
+# ticker name used for the synthetic data
+BENCH_TICKER = "bench"
+
+# Stock methods timed on their own, whichever stage they are called from
+TIMED_METHODS = [
+    'load_prices', 'sentiment_analysis', 'analyst_recommendation', 'calculate_indicators',
+    'plotting_shift', 'subplot_total', 'subplot_years', 'generate_report',
+]
+
+# words the synthetic headlines are made from. the positive/negative ones are in the vader
+# lexicon so the sentiment spreads over all three buckets like real headlines do
+NEUTRAL_WORDS = [
+    "shares", "company", "quarter", "report", "market", "investors", "analysts", "stock", "earnings",
+    "revenue", "guidance", "deal", "ceo", "board", "options", "trading", "sector", "index", "week",
+]
+POSITIVE_WORDS = ["gains", "beats", "strong", "record", "growth", "win", "boost", "rally", "upbeat"]
+NEGATIVE_WORDS = ["falls", "misses", "weak", "lawsuit", "loss", "cuts", "fears", "plunge", "warning"]
+
+FIRMS = [
+    "UBS", "Morgan Stanley", "Barclays", "Goldman Sachs", "JP Morgan", "Citigroup", "Wells Fargo",
+    "Credit Suisse", "Deutsche Bank", "B of A Securities", "Jefferies", "Raymond James", "Wedbush",
+]
+CHANGES = ["Maintains", "Upgrade", "Downgrade", "Initiated", "Reiterates"]
+
+
+def synthetic_prices(days, seed=0, start="2000-01-03"):
+    # a geometric random walk with plausible highs/lows and volume, one row per business day.
+    # same seed, same history
+    rng = np.random.RandomState(seed)
+    index = pd.bdate_range(start, periods=days, name="Date")
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, days)))
+    open_ = close * np.exp(rng.normal(0, 0.005, days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, days)))
+    volume = rng.lognormal(15, 0.5, days).round()
+    return pd.DataFrame({
+        "Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume,
+        "Dividends": 0.0, "Stock Splits": 0.0,
+    }, index=index)
+
+
+def synthetic_headlines(count, dates, seed=0):
+    # count headlines spread over dates, newest first like the scrapers store them
+    rng = np.random.RandomState(seed)
+    lengths = rng.randint(6, 13, count)
+    tone = rng.choice([-1, 0, 1], count, p=[0.3, 0.4, 0.3])
+    headlines = []
+    for length, sign in zip(lengths, tone):
+        words = list(rng.choice(NEUTRAL_WORDS, length))
+        if sign:
+            words[rng.randint(length)] = rng.choice(POSITIVE_WORDS if sign > 0 else NEGATIVE_WORDS)
+        headlines.append(" ".join(words).capitalize())
+    picked = pd.DatetimeIndex(rng.choice(dates, count)).sort_values(ascending=False)
+    return pd.DataFrame({"Date": picked, "Headline": headlines})
+
+
+def synthetic_analysts(count, dates, rules, seed=0):
+    # recommendations use the wording in the rules table so all of them encode
+    rng = np.random.RandomState(seed)
+    picked = pd.DatetimeIndex(rng.choice(dates, count)).sort_values(ascending=False)
+    return pd.DataFrame({
+        "Change": rng.choice(CHANGES, count),
+        "Analyst": rng.choice(FIRMS, count),
+        "Recommendation": rng.choice(sorted(rules["values"]), count),
+        "Date": picked,
+    })
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import matplotlib
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def time_run(stock_class, stock_kwargs):
+    # build every stage of one Stock, timing each stage and each of TIMED_METHODS
+    stock = stock_class(BENCH_TICKER, lazy=True, **stock_kwargs)
+    methods = {name: 0.0 for name in TIMED_METHODS}
+
+    def timed(name, method):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                methods[name] += time.perf_counter() - start
+        return wrapper
+
+    for name in TIMED_METHODS:
+        setattr(stock, name, timed(name, getattr(stock, name)))
+
+    stages = {}
+    for stage in stock_class.STAGES:
+        start = time.perf_counter()
+        stock.require(stage)
+        stages[stage] = time.perf_counter() - start
+
+    # with render workers the figures may still be drawing
+    start = time.perf_counter()
+    stock.renderer.wait()
+    stages['render_wait'] = time.perf_counter() - start
+    return stages, methods, stock.memory_footprint().sum()
+
+
+def summarize(runs):
+    # {name: [seconds per repeat]} -> {name: {min, median, mean, runs}}
+    return {
+        name: {
+            "min": min(times),
+            "median": float(np.median(times)),
+            "mean": float(np.mean(times)),
+            "runs": times,
+        }
+        for name, times in runs.items()
+    }
+
+
+def run_benchmark(days=5000, headlines=20000, analysts=1000, repeat=3, seed=0,
+                  sentiment_workers=1, render_workers=1, dpi=None, fig_format='png', lean=False):
+    # everything happens in a scratch directory, figs/ reports/ and the stores included,
+    # and nothing is cached between repeats so every run does the full work
+    workdir = tempfile.mkdtemp(prefix="stock_bench_")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        import base
+        from prices import PriceStore
+        from store import TextStore
+        from recommendations import load_rules
+
+        # base works out its directories from where it was imported
+        base.mypath = workdir
+        os.makedirs("figs", exist_ok=True)
+        os.makedirs("reports", exist_ok=True)
+
+        prices = synthetic_prices(days, seed)
+        price_store = PriceStore(os.path.join(workdir, "prices"))
+        price_store.save(BENCH_TICKER, prices)
+        text_store = TextStore(os.path.join(workdir, "store"))
+        text_store.append("headlines", BENCH_TICKER, synthetic_headlines(headlines, prices.index, seed))
+        text_store.append("analysts", BENCH_TICKER, synthetic_analysts(analysts, prices.index, load_rules(), seed))
+
+        stock_kwargs = {
+            "price_store": price_store, "text_store": text_store, "price_refresh": False,
+            "sentiment_workers": sentiment_workers, "sentiment_cache": None, "artifact_cache": None,
+            "render_workers": render_workers, "fig_format": fig_format, "lean": lean,
+        }
+        if dpi is not None:
+            stock_kwargs["dpi"] = dpi
+
+        stage_runs, method_runs, totals, footprints = {}, {}, [], []
+        for i in range(repeat):
+            start = time.perf_counter()
+            stages, methods, footprint_mb = time_run(base.Stock, stock_kwargs)
+            totals.append(time.perf_counter() - start)
+            footprints.append(footprint_mb)
+            for name, seconds in stages.items():
+                stage_runs.setdefault(name, []).append(seconds)
+            for name, seconds in methods.items():
+                method_runs.setdefault(name, []).append(seconds)
+            print("run {} of {}: {:.2f}s".format(i+1, repeat, totals[-1]))
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "environment": environment(),
+        "config": {
+            "days": days, "headlines": headlines, "analysts": analysts, "repeat": repeat, "seed": seed,
+            "sentiment_workers": sentiment_workers, "render_workers": render_workers,
+            "dpi": dpi, "fig_format": fig_format, "lean": lean,
+        },
+        "footprint_mb": max(footprints),
+        "total": summarize({"total": totals})["total"],
+        "stages": summarize(stage_runs),
+        "methods": summarize(method_runs),
+    }
+
+
+def compare(result, baseline):
+    # median seconds side by side, ratio > 1 means this run is slower than the baseline
+    rows = []
+    for group in ("stages", "methods"):
+        for name, timing in result[group].items():
+            before = baseline.get(group, {}).get(name)
+            if before is None:
+                continue
+            ratio = timing["median"] / before["median"] if before["median"] else float("nan")
+            rows.append([group, name, before["median"], timing["median"], ratio])
+    rows.append(["total", "total", baseline["total"]["median"], result["total"]["median"],
+                 result["total"]["median"] / baseline["total"]["median"]])
+    return pd.DataFrame(rows, columns=["Group", "Name", "Baseline", "Current", "Ratio"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every Stock stage on synthetic data, no network needed")
+    parser.add_argument("--days", type=int, default=5000, help="business days of price history")
+    parser.add_argument("--headlines", type=int, default=20000, help="number of headlines")
+    parser.add_argument("--analysts", type=int, default=1000, help="number of analyst recommendations")
+    parser.add_argument("--repeat", type=int, default=3, help="full runs to time")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic data")
+    parser.add_argument("--sentiment-workers", type=int, default=1)
+    parser.add_argument("--render-workers", type=int, default=1)
+    parser.add_argument("--dpi", type=int, default=None, help="figure resolution, defaults to base.DPI")
+    parser.add_argument("--format", default="png", help="figure file format")
+    parser.add_argument("--lean", action="store_true", help="run Stock in its memory lean mode")
+    parser.add_argument("--output", default=BENCH_PATH, help="json file for the results")
+    parser.add_argument("--compare", default=None, help="earlier results json to compare against")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        days=args.days, headlines=args.headlines, analysts=args.analysts, repeat=args.repeat,
+        seed=args.seed, sentiment_workers=args.sentiment_workers, render_workers=args.render_workers,
+        dpi=args.dpi, fig_format=args.format, lean=args.lean
+    )
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print("Wrote results to {}".format(args.output))
+
+    table = pd.DataFrame(
+        [[group, name, timing["median"], timing["min"]]
+         for group in ("stages", "methods") for name, timing in result[group].items()],
+        columns=["Group", "Name", "Median", "Min"]
+    )
+    print(table.round(3).to_string(index=False))
+    print("Stock held {:.1f} MB".format(result["footprint_mb"]))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(compare(result, baseline).round(3).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
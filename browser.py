@@ -0,0 +1,193 @@
+import atexit
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException, StaleElementReferenceException
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+
+# longest we wait for an element to show up before the attempt counts as failed
+WAIT_TIMEOUT = 20
+
+# how often a wait re-checks the page
+POLL_INTERVAL = 0.1
+
+# attempts per scraping step, the wait between them doubles starting at BACKOFF seconds
+RETRIES = 3
+BACKOFF = 1.0
+
+
+class ScrapeError(Exception):
+    pass
+
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def chrome_driver_path():
+    # ChromeDriverManager().install() looks the driver up online, so only do it once per process
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = ChromeDriverManager().install()
+    return _driver_path
+
+
+def chrome(headless=True):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    # the scrapers use absolute xpaths, so give headless chrome the same layout as a desktop window
+    options.add_argument('--window-size=1920,1080')
+    options.add_argument('--disable-dev-shm-usage')
+    return webdriver.Chrome(service=Service(chrome_driver_path()), options=options)
+
+
+class BrowserPool:
+    # up to size browser sessions that are handed out one at a time and reused between tickers.
+    # factory makes a new driver, anything with the selenium driver methods works (e.g. for fixtures)
+    def __init__(self, size=1, factory=None, headless=True) -> None:
+        self.size = size
+        self.factory = factory if factory is not None else (lambda: chrome(headless))
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def acquire(self, timeout=None):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if self.closed:
+                raise ScrapeError("browser pool is closed")
+            start_new = self.created < self.size
+            if start_new:
+                self.created += 1
+        if start_new:
+            try:
+                return self.factory()
+            except Exception:
+                with self.lock:
+                    self.created -= 1
+                raise
+
+        # every session is busy, wait for one to come back
+        try:
+            return self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ScrapeError("no browser session free after {}s".format(timeout))
+
+    def release(self, driver, healthy=True):
+        if healthy and not self.closed:
+            self.idle.put(driver)
+            return
+        with self.lock:
+            self.created -= 1
+        _quit(driver)
+
+    @contextmanager
+    def session(self, timeout=None):
+        # a failed scrape can leave the browser on a half loaded page (or dead), so it is thrown away
+        driver = self.acquire(timeout)
+        healthy = False
+        try:
+            yield driver
+            healthy = True
+        finally:
+            self.release(driver, healthy)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            with self.lock:
+                self.created -= 1
+            _quit(driver)
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        # the browser is already gone
+        pass
+
+
+_shared_pool = None
+
+
+def shared_pool():
+    # one pool per process so every Stock built in it reuses the same browser
+    global _shared_pool
+    if _shared_pool is None or _shared_pool.closed:
+        _shared_pool = BrowserPool()
+        atexit.register(_shared_pool.close)
+    return _shared_pool
+
+
+def close_shared_pool():
+    global _shared_pool
+    if _shared_pool is not None:
+        _shared_pool.close()
+        _shared_pool = None
+
+
+def retry(action, what, attempts=None, backoff=None, retry_on=(WebDriverException,)):
+    # run action() until it works, waiting backoff, 2*backoff, ... between attempts.
+    # the last failure is raised as a ScrapeError saying what was being done
+    attempts = attempts if attempts is not None else RETRIES
+    backoff = backoff if backoff is not None else BACKOFF
+    for attempt in range(1, attempts+1):
+        try:
+            return action()
+        except retry_on as e:
+            reason = "{}: {}".format(type(e).__name__, (str(e).strip().splitlines() or [''])[0])
+            if attempt == attempts:
+                raise ScrapeError("{} failed after {} attempts ({})".format(what, attempts, reason)) from e
+            delay = backoff * 2**(attempt-1)
+            print("{} failed ({}), retrying in {}s".format(what, reason, delay))
+            time.sleep(delay)
+
+
+def wait_for(driver, xpath, timeout=None, condition=EC.presence_of_element_located):
+    # block until the element is there (or whatever condition says), not a moment longer
+    return WebDriverWait(driver, timeout or WAIT_TIMEOUT, poll_frequency=POLL_INTERVAL).until(
+        condition((By.XPATH, xpath)), "waiting for {}".format(xpath)
+    )
+
+
+def wait_for_text(driver, xpath, timeout=None, previous=None):
+    # the element's text once it has rendered. with previous, wait until the text is different
+    # from it, which is how we know a tab has swapped its contents in place
+    def rendered(driver):
+        try:
+            text = driver.find_element(By.XPATH, xpath).text
+        except StaleElementReferenceException:
+            return False
+        if text and text != previous:
+            return text
+        return False
+
+    return WebDriverWait(driver, timeout or WAIT_TIMEOUT, poll_frequency=POLL_INTERVAL).until(
+        rendered, "waiting for {} to render".format(xpath)
+    )
+
+
+def click(driver, element):
+    # a javascript click works even when an overlay or the sticky header covers the element
+    driver.execute_script("arguments[0].scrollIntoView(true);", element)
+    driver.execute_script("arguments[0].click();", element)
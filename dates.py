@@ -0,0 +1,51 @@
+import datetime
+import re
+import numpy as np
+import pandas as pd
+
+
+# absolute formats headline dates come in, tried in order on whatever is still unparsed:
+# how the csvs store them, how nasdaq shows older headlines ("NOV 1, 2022") and iso
+ABSOLUTE_FORMATS = ("%m/%d/%Y", "%b %d, %Y", "%Y-%m-%d")
+
+# nasdaq shows recent headlines as "5 HOURS AGO", "1 DAY AGO", "30 MIN AGO"
+RELATIVE = re.compile(r'^(\d+)\s*(MIN|MINS|MINUTE|MINUTES|HOUR|HOURS|DAY|DAYS)\b')
+RELATIVE_SECONDS = {
+    'MIN': 60, 'MINS': 60, 'MINUTE': 60, 'MINUTES': 60,
+    'HOUR': 3600, 'HOURS': 3600,
+    'DAY': 86400, 'DAYS': 86400,
+}
+
+
+def normalize_dates(raw, now=None):
+    # parse a whole column of headline dates at once with explicit formats, no per-row guessing.
+    # relative dates count back from now (the time of the scrape, so every row uses the same
+    # one) and everything lands on midnight of its day.
+    # returns (datetime64 series, the raw values that couldn't be parsed)
+    raw = pd.Series(raw)
+    now = pd.Timestamp(now if now is not None else datetime.datetime.now())
+
+    # a few thousand distinct days cover ~100k headlines, so only parse each string once
+    text = raw.where(raw.isna(), raw.astype(str).str.strip().str.upper())
+    codes, uniques = pd.factorize(text)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+
+    relative = uniques.str.extract(RELATIVE)
+    is_relative = relative[0].notna()
+    if is_relative.any():
+        seconds = relative.loc[is_relative, 0].astype(np.int64) * relative.loc[is_relative, 1].map(RELATIVE_SECONDS)
+        parsed[is_relative] = (now - pd.to_timedelta(seconds, unit='s')).dt.normalize()
+
+    for date_format in ABSOLUTE_FORMATS:
+        todo = parsed.isna() & ~is_relative
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(uniques[todo], format=date_format, errors='coerce')
+
+    # missing values have code -1 and stay NaT
+    values = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+    found = codes >= 0
+    values[found] = parsed.to_numpy()[codes[found]]
+    dates = pd.Series(values, index=raw.index, name=raw.name)
+    return dates, raw[dates.isna()]
@@ -0,0 +1,173 @@
+import re
+import zlib
+import numpy as np
+import pandas as pd
+
+
+# headlines are compared on overlapping runs of this many words of their normalized text. with
+# characters (or single words) "Why Apple Stock Jumped Today" and "... Slumped Today" look alike
+SHINGLE_SIZE = 2
+
+# minhash signature length, split into BANDS bands for locality sensitive hashing. two headlines
+# become candidates when any band matches, which is likely above (1/BANDS)**(1/rows per band) ~ 0.5
+NUM_PERM = 64
+BANDS = 16
+
+# candidates are near duplicates when the jaccard similarity of their shingles is at least this and
+# one is the other with words added (a source, "US STOCKS-", "EXCLUSIVE-"). a changed word can flip
+# the sentiment ("dollar slips"/"dollar recovers"), so that is never a copy
+THRESHOLD = 0.7
+
+# only headlines at most this many days apart are compared, the same text a month later is new news
+WINDOW_DAYS = 1
+
+# near duplicate (syndicated) headlines are scored once and count once towards the daily values
+DEDUP_HEADLINES = True
+
+# fixed so the hash functions (and so the clusters) are the same every run
+SEED = 1
+
+# the hash functions are applied this many at a time to keep the temporary arrays small
+PERM_CHUNK = 8
+
+NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    # case, punctuation and spacing don't make a headline different
+    return NON_WORD.sub(' ', str(text).lower()).strip()
+
+
+def shingle_hashes(words, size=SHINGLE_SIZE):
+    # crc32 of every run of size words, a headline shorter than size is one shingle
+    count = max(len(words) - size + 1, 1)
+    shingles = (zlib.crc32(' '.join(words[i:i+size]).encode('utf-8')) for i in range(count))
+    return np.unique(np.fromiter(shingles, dtype=np.uint64, count=count))
+
+
+def signatures(hashes, num_perm=NUM_PERM, seed=SEED):
+    # (len(hashes), num_perm) minhash signatures of every headline's shingle_hashes. every hash
+    # function is a multiply-shift hash over all shingles at once, then the minimum is taken per
+    # headline with reduceat
+    if len(hashes) == 0:
+        return np.empty((0, num_perm), dtype=np.uint64)
+    offsets = np.concatenate(([0], np.cumsum([len(h) for h in hashes])[:-1]))
+    hashes = np.concatenate(hashes)
+
+    # random odd 64 bit multipliers and 64 bit increments
+    rng = np.random.RandomState(seed)
+    words = rng.randint(0, 2**32, (4, num_perm), dtype=np.uint64)
+    multipliers = (words[0] << np.uint64(32)) | words[1] | np.uint64(1)
+    increments = (words[2] << np.uint64(32)) | words[3]
+
+    result = np.empty((len(offsets), num_perm), dtype=np.uint64)
+    for start in range(0, num_perm, PERM_CHUNK):
+        chunk = slice(start, start + PERM_CHUNK)
+        # uint64 arithmetic wraps, which is what multiply-shift hashing wants
+        values = (multipliers[chunk, None] * hashes[None, :] + increments[chunk, None]) >> np.uint64(32)
+        result[:, chunk] = np.minimum.reduceat(values, offsets, axis=1).T
+    return result
+
+
+def near_copy(words, other_words, hashes, other_hashes, threshold=THRESHOLD):
+    # the exact check behind the minhash estimate: similar enough, and the shorter headline's
+    # words all appear in the longer one in the same order
+    union = len(np.union1d(hashes, other_hashes))
+    if len(np.intersect1d(hashes, other_hashes)) < threshold * union:
+        return False
+    shorter, longer = sorted((words, other_words), key=len)
+    remaining = iter(longer)
+    return all(word in remaining for word in shorter)
+
+
+def _leaders(days, left, right, window_days, copy):
+    # cluster rows (in date order) from the similar pairs: every row joins the earliest cluster it
+    # is similar to, as long as it is within window_days of the cluster's first headline and
+    # copy(first, row) says it is a near copy of it too. comparing against the first headline
+    # stops templated headlines ("Stock Market News for Jun 9") chaining day after day, and a copy
+    # of a copy with a changed word joining the original
+    labels = np.arange(len(days))
+    pairs = np.unique(np.stack([right, left], axis=1), axis=0)
+    for j, i in pairs:
+        leader = labels[i]
+        if leader < labels[j] and days[j] - days[leader] <= window_days and (leader == i or copy(leader, j)):
+            labels[j] = leader
+    return labels
+
+
+def cluster_headlines(dates, headlines, threshold=THRESHOLD, window_days=WINDOW_DAYS, bands=BANDS):
+    # cluster label of every headline: the position of the first (earliest, then first listed)
+    # headline it is a near duplicate of, its own position when it has none
+    dates = pd.DatetimeIndex(dates)
+    count = len(dates)
+    if count == 0:
+        return np.array([], dtype=np.int64)
+
+    # work in date order so each cluster's label is its earliest headline
+    order = np.argsort(dates.to_numpy(), kind='stable')
+    days = (dates.normalize().to_numpy()[order].astype('datetime64[D]')).astype(np.int64)
+
+    # identical texts share a signature, only the distinct ones are hashed
+    codes, unique = pd.factorize(pd.Series(headlines).iloc[order].map(normalize))
+    words = [text.split() for text in unique]
+    hashes = [shingle_hashes(text_words) for text_words in words]
+    signature = signatures(hashes)[codes]
+
+    rows = signature.shape[1] // bands
+    left, right = [], []
+    for band in range(bands):
+        key = np.ascontiguousarray(signature[:, band*rows:(band+1)*rows])
+        bucket = pd.factorize(key.view(np.dtype((np.void, key.dtype.itemsize * rows))).ravel())[0]
+        # neighbours in (bucket, day) order that are within the window are candidates. the sort is
+        # stable and rows are in date order, so the first of every pair is the earlier row
+        by_bucket = np.lexsort((days, bucket))
+        first, second = by_bucket[:-1], by_bucket[1:]
+        near = (bucket[first] == bucket[second]) & (days[second] - days[first] <= window_days)
+        left.append(first[near])
+        right.append(second[near])
+
+    # candidates are checked exactly, once for every distinct pair of texts
+    verdicts = {}
+
+    def copy(i, j):
+        a, b = codes[i], codes[j]
+        if (a, b) not in verdicts:
+            verdicts[a, b] = a == b or near_copy(words[a], words[b], hashes[a], hashes[b], threshold)
+        return verdicts[a, b]
+
+    left, right = np.concatenate(left), np.concatenate(right)
+    similar = np.array([copy(i, j) for i, j in zip(left, right)], dtype=bool)
+    labels = _leaders(days, left[similar], right[similar], window_days, copy)
+
+    # back from date order to the order the headlines came in
+    clusters = np.empty(count, dtype=np.int64)
+    clusters[order] = order[labels]
+    return clusters
+
+
+def collapse_headlines(headlines, **kwargs):
+    # headlines with Cluster (position of the cluster's representative), Weight (how many headlines
+    # the cluster has) and Representative (the one headline per cluster that gets scored/counted).
+    # the daily values count every cluster once on purpose, weighting them by Weight would bring
+    # back the skew from a story being syndicated many times. Weight says how widely it was
+    # carried, for anyone who wants that as a signal of its own
+    clusters = cluster_headlines(headlines['Date'], headlines['Headline'], **kwargs)
+    sizes = np.bincount(clusters, minlength=len(clusters))
+    return headlines.assign(
+        Cluster=clusters,
+        Weight=sizes[clusters],
+        Representative=clusters == np.arange(len(clusters)),
+    )
+
+
+def representatives(headlines, by=None, **kwargs):
+    # just the headline standing in for each cluster, with its Weight. with by (e.g. 'Ticker')
+    # headlines are only clustered with others in the same group
+    groups = [headlines] if by is None else [group for _, group in headlines.groupby(by, sort=False)]
+    kept = []
+    for group in groups:
+        collapsed = collapse_headlines(group, **kwargs)
+        kept.append(collapsed[collapsed['Representative'].to_numpy()].drop(columns=['Cluster', 'Representative']))
+    if not kept:
+        return headlines.assign(Weight=pd.Series(dtype=np.int64))
+    return pd.concat(kept)
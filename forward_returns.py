@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+
+# quantiles reported for every bound/horizon on top of count, mean, std, min and max
+QUANTILES = [0.25, 0.5, 0.75]
+
+STAT_COLUMNS = ['count', 'mean', 'std', 'min', 'max']
+
+
+def horizon_column(days, percent=False):
+    # same naming plotting_shift has always used, percent returns get a % suffix
+    if percent:
+        return '{}-day %'.format(days)
+    return '{}-day'.format(days)
+
+
+def forward_return_frame(signal, price_history, horizons, market_time='Close', keep_prices=True):
+    # lines the signal up with the price history and adds the forward return over every horizon.
+    # like plotting_shift, only days that have both a signal and a price are kept and the
+    # shift is over those rows, then any row missing a return on some horizon is dropped.
+    # the signal is looked up on the price dates rather than outer merged with a copy of the prices,
+    # keep_prices=False also leaves the High/Low/Close columns out of the result
+    valid = price_history[['High', 'Low', 'Close']].notna().all(axis=1).to_numpy()
+    bound = signal.reindex(price_history.index)
+    rows = valid & bound.notna().to_numpy()
+
+    frame = pd.DataFrame({'Bound': bound.to_numpy()[rows]}, index=price_history.index[rows])
+    if keep_prices:
+        for column in ['High', 'Low', 'Close']:
+            frame[column] = price_history[column].to_numpy()[rows]
+
+    price = price_history[market_time].to_numpy(dtype=float)[rows]
+    columns = {}
+    for days in horizons:
+        future = np.full(len(price), np.nan)
+        if days < len(price):
+            future[:len(price)-days] = price[days:]
+        columns[horizon_column(days)] = future - price
+        columns[horizon_column(days, True)] = (future - price) / price * 100
+
+    frame = pd.concat([frame, pd.DataFrame(columns, index=frame.index)], axis=1)
+    return frame.dropna()
+
+
+def forward_return_stats(frame, horizons, bounds_values=None, quantiles=QUANTILES):
+    # one grouped pass over every bound value, horizon and measure (absolute and percent).
+    # returns a tidy frame with one row per (Bound, Horizon, Measure)
+    columns = [horizon_column(days, percent) for percent in (False, True) for days in horizons]
+    stats = frame.groupby('Bound')[columns].describe(percentiles=quantiles)
+
+    # describe names the quantile columns 25%, 50%, ... so give them stable names
+    quantile_names = {'{:g}%'.format(q*100): 'q{:g}'.format(q*100) for q in quantiles}
+    stats = stats.rename(columns=quantile_names, level=1)
+    stats = stats.stack(level=0)
+    stats.index.names = ['Bound', 'Column']
+
+    # bounds that never happened still get a row, with a count of 0
+    if bounds_values is not None:
+        stats = stats.reindex(pd.MultiIndex.from_product([bounds_values, columns], names=['Bound', 'Column']))
+        stats['count'] = stats['count'].fillna(0)
+
+    stats = stats.reset_index()
+    measure = stats['Column'].str.endswith('%')
+    stats.insert(1, 'Horizon', stats['Column'].str.split('-').str[0].astype(int))
+    stats.insert(2, 'Measure', np.where(measure, 'pct', 'abs'))
+    stats['count'] = stats['count'].astype(int)
+
+    stat_order = STAT_COLUMNS + list(quantile_names.values())
+    return stats[['Bound', 'Horizon', 'Measure', 'Column'] + stat_order].sort_values(
+        ['Bound', 'Measure', 'Horizon'], kind='stable'
+    ).reset_index(drop=True)
+
+
+def stats_by_bound(stats, bounds_values, measure='abs'):
+    # the {bound}_mean/_min/_max series (indexed by horizon column) that unwrap_data reads
+    stats = stats[stats['Measure'] == measure]
+    to_return = {}
+    for value in bounds_values:
+        rows = stats[stats['Bound'] == value].set_index('Column')
+        rows.index.name = None
+        to_return[str(value)+'_mean'] = rows['mean'].rename(None)
+        to_return[str(value)+'_min'] = rows['min'].rename(None)
+        to_return[str(value)+'_max'] = rows['max'].rename(None)
+    return to_return
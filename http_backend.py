@@ -0,0 +1,250 @@
+import asyncio
+import datetime
+import types
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import pandas as pd
+from browser import ScrapeError
+
+
+# the json endpoints behind nasdaq's headline tabs and yahoo's upgrades/downgrades table
+NEWS_API_URL = "https://api.nasdaq.com/api/news/topic/articlebysymbol"
+ANALYST_API_URL = "https://query2.finance.yahoo.com/v10/finance/quoteSummary/{}"
+
+# yahoo wants a cookie + crumb pair, set to None for servers that don't (e.g. recorded responses)
+CRUMB_COOKIE_URL = "https://fc.yahoo.com"
+CRUMB_URL = "https://query2.finance.yahoo.com/v1/test/getcrumb"
+
+# headlines per request, nasdaq's page only shows 10 but the api happily returns more
+PAGE_SIZE = 100
+
+# requests per second across every ticker, and how many connections can be open at once
+RATE_LIMIT = 5
+CONCURRENCY = 8
+
+# attempts per request, the wait between them doubles starting at BACKOFF seconds
+RETRIES = 3
+BACKOFF = 1.0
+
+# nasdaq's api turns away clients that don't look like a browser
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# yahoo's action codes -> the Change column the analysis page shows
+CHANGES = {
+    "up": "Upgrade",
+    "down": "Downgrade",
+    "main": "Maintains",
+    "init": "Initiated",
+    "reit": "Reiterates",
+}
+
+NEWS_COLUMNS = ["Date", "Headline"]
+ANALYST_COLUMNS = ["Change", "Analyst", "Recommendation", "Date"]
+
+
+class RateLimiter:
+    # hands out start times at most rate per second apart, shared by every request in a run
+    def __init__(self, rate) -> None:
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            now = loop.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def news_date(created):
+    # "Nov 1, 2022" -> "11/1/2022", the same text the headline tabs are turned into
+    return "{d.month}/{d.day}/{d.year}".format(d=datetime.datetime.strptime(created.strip(), "%b %d, %Y"))
+
+
+def news_rows(payload):
+    # (rows, total headlines) from one page of the nasdaq api
+    data = payload.get("data") or {}
+    rows = [[news_date(row["created"]), row["title"].strip()] for row in data.get("rows") or []]
+    return rows, int(data.get("totalrecords") or 0)
+
+
+def analyst_rows(payload):
+    result = payload["quoteSummary"]["result"]
+    history = (result[0].get("upgradeDowngradeHistory") or {}).get("history", []) if result else []
+    rows = []
+    for entry in history:
+        date = pd.Timestamp(entry["epochGradeDate"], unit="s")
+        from_grade = entry.get("fromGrade") or ""
+        # same text as the table: "Neutral to Buy", or "to Buy" without a previous grade
+        recommendation = "{} to {}".format(from_grade, entry.get("toGrade") or "").strip()
+        rows.append([
+            CHANGES.get(entry.get("action"), entry.get("action")),
+            entry["firm"],
+            recommendation,
+            "{d.month}/{d.day}/{d.year}".format(d=date)
+        ])
+    return rows
+
+
+def _run_sync(coroutine):
+    # asyncio.run refuses to start while an event loop is running (jupyter, vs code cells),
+    # then the coroutine gets a loop of its own on a worker thread
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coroutine).result()
+
+
+class HttpScraper:
+    # browserless scraping: the data behind the pages fetched over one pooled aiohttp session,
+    # many pages and tickers at once under a shared rate limit
+    def __init__(self, rate_limit=RATE_LIMIT, concurrency=CONCURRENCY, page_size=PAGE_SIZE,
+                 retries=RETRIES, backoff=BACKOFF, timeout=30, news_url=NEWS_API_URL,
+                 analyst_url=ANALYST_API_URL, crumb_url=CRUMB_URL, crumb_cookie_url=CRUMB_COOKIE_URL) -> None:
+        self.rate_limit = rate_limit
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.news_url = news_url
+        self.analyst_url = analyst_url
+        self.crumb_url = crumb_url
+        self.crumb_cookie_url = crumb_cookie_url
+
+    def news(self, tickers, stop_at=None):
+        # headlines for one ticker (a DataFrame, raises if it couldn't be fetched) or many
+        # (({ticker: DataFrame}, {ticker: exception}) so one failing ticker doesn't lose the rest).
+        # stop_at is {ticker: set of (timestamp, headline)} (or just the set for one ticker)
+        single = isinstance(tickers, str)
+        if single:
+            stop_at = {tickers: stop_at}
+        return self._results(tickers, *self._run(self._news, [tickers] if single else tickers, stop_at or {}))
+
+    def analysts(self, tickers):
+        # like news
+        single = isinstance(tickers, str)
+        return self._results(tickers, *self._run(self._analysts, [tickers] if single else tickers))
+
+    @staticmethod
+    def _results(tickers, frames, failures):
+        if not isinstance(tickers, str):
+            return frames, failures
+        if tickers in failures:
+            raise failures[tickers]
+        return frames[tickers]
+
+    def _run(self, fetch, tickers, *args):
+        # ({ticker: DataFrame}, {ticker: exception}) for the tickers that worked and the ones that didn't
+        async def run_all():
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS) as session:
+                # what every request in this run shares
+                run = types.SimpleNamespace(session=session, limiter=RateLimiter(self.rate_limit), crumb=None)
+                return await asyncio.gather(*[fetch(run, ticker, *args) for ticker in tickers], return_exceptions=True)
+
+        frames, failures = {}, {}
+        for ticker, result in zip(tickers, _run_sync(run_all())):
+            if isinstance(result, Exception):
+                print("{}: {}: {}".format(ticker, type(result).__name__, result))
+                failures[ticker] = result
+            elif isinstance(result, BaseException):
+                # cancelled or interrupted, not something about this ticker
+                raise result
+            else:
+                frames[ticker] = result
+        return frames, failures
+
+    async def _get(self, run, url, params=None, json=True):
+        # one request with bounded retries. 429 and 5xx are worth another go, other statuses aren't
+        for attempt in range(1, self.retries+1):
+            await run.limiter.wait()
+            try:
+                async with run.session.get(url, params=params) as response:
+                    if response.status == 429 or response.status >= 500:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history,
+                            status=response.status, message=response.reason or ""
+                        )
+                    if response.status >= 400:
+                        raise ScrapeError("{} returned {} {}".format(url, response.status, response.reason))
+                    if json:
+                        return await response.json(content_type=None)
+                    return await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                reason = "{}: {}".format(type(e).__name__, e)
+                if attempt == self.retries:
+                    raise ScrapeError("{} failed after {} attempts ({})".format(url, self.retries, reason)) from e
+                delay = self.backoff * 2**(attempt-1)
+                print("{} failed ({}), retrying in {}s".format(url, reason, delay))
+                await asyncio.sleep(delay)
+
+    async def _news(self, run, ticker, stop_at):
+        known = stop_at.get(ticker)
+        params = {"q": "{}|stocks".format(ticker), "limit": self.page_size, "fallback": "false"}
+
+        async def page(offset):
+            payload = await self._get(run, self.news_url, dict(params, offset=offset))
+            return news_rows(payload)
+
+        rows, total = await page(0)
+        headlines = []
+        caught_up = self._keep(headlines, rows, known)
+
+        # the rest of the pages go out together, a window at a time so an update
+        # stops asking for more once it reaches headlines that are already stored
+        offsets = list(range(self.page_size, total, self.page_size))
+        window = self.concurrency if known is not None else len(offsets)
+        while offsets and not caught_up:
+            batch, offsets = offsets[:window], offsets[window:]
+            for rows, _ in await asyncio.gather(*[page(offset) for offset in batch]):
+                caught_up = self._keep(headlines, rows, known)
+                if caught_up:
+                    break
+
+        print("fetched {} headlines for {}".format(len(headlines), ticker))
+        return pd.DataFrame(headlines, columns=NEWS_COLUMNS)
+
+    @staticmethod
+    def _keep(headlines, rows, known):
+        # add a page of rows, returns True once it hits a headline we already have
+        if known is None:
+            headlines.extend(rows)
+            return False
+        new_rows = [row for row in rows if (pd.Timestamp(row[0]), row[1]) not in known]
+        headlines.extend(new_rows)
+        return len(new_rows) < len(rows)
+
+    async def _analysts(self, run, ticker):
+        params = {"modules": "upgradeDowngradeHistory"}
+        if self.crumb_url:
+            # every ticker waits on the same crumb request
+            if run.crumb is None:
+                run.crumb = asyncio.ensure_future(self._crumb(run))
+            params["crumb"] = await run.crumb
+        payload = await self._get(run, self.analyst_url.format(ticker), params)
+        rows = analyst_rows(payload)
+        print("fetched {} analyst recommendations for {}".format(len(rows), ticker))
+        return pd.DataFrame(rows, columns=ANALYST_COLUMNS)
+
+    async def _crumb(self, run):
+        # the cookie lands in the session's cookie jar, the crumb has to go with it on every request
+        if self.crumb_cookie_url:
+            try:
+                await run.limiter.wait()
+                async with run.session.get(self.crumb_cookie_url) as response:
+                    await response.read()
+            except aiohttp.ClientError:
+                # fc.yahoo.com answers with an error page, only the cookie matters
+                pass
+        return (await self._get(run, self.crumb_url, json=False)).strip()
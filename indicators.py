@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+
+# default indicator settings, these are what Stock has always used
+PERIOD = 14
+RSI_BOUNDS = (30, 70)
+ADX_LEVELS = (25, 50, 75)
+
+
+def _ewm(columns, period, index):
+    # wilder smoothing (same alpha and adjust=True as finta) for several columns in one call
+    return pd.DataFrame(columns, index=index).ewm(alpha=1.0 / period, adjust=True).mean()
+
+
+def compute_indicators(price_history, period=PERIOD, rsi_bounds=RSI_BOUNDS, adx_levels=ADX_LEVELS):
+    # RSI, OBV, DMI and ADX plus their bounds in a single pass over the OHLCV arrays.
+    # price deltas, true range and the directional moves are only worked out once and
+    # every column that uses the same smoothing goes through one ewm call.
+    # numerically this matches finta's RSI/OBV/DMI/ADX followed by the old banding
+    index = price_history.index
+    high = price_history['High'].to_numpy(dtype=float)
+    low = price_history['Low'].to_numpy(dtype=float)
+    close = price_history['Close'].to_numpy(dtype=float)
+    volume = price_history['Volume'].to_numpy(dtype=float)
+
+    # shared intermediates
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    delta = close - prev_close
+    up_move = np.concatenate(([np.nan], np.diff(high)))
+    down_move = np.concatenate(([np.nan], -np.diff(low)))
+
+    # true range, nan parts are ignored like DataFrame.max does
+    true_range = np.fmax(np.abs(high - low), np.fmax(np.abs(high - prev_close), np.abs(prev_close - low)))
+    atr = pd.Series(true_range).rolling(period).mean().to_numpy()
+
+    gain = np.where(delta < 0, 0, delta)
+    loss = np.abs(np.where(delta > 0, 0, delta))
+    plus = np.where((up_move > down_move) & (up_move > 0), up_move, 0)
+    minus = np.where((down_move > up_move) & (down_move > 0), down_move, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        smoothed = _ewm({'gain': gain, 'loss': loss, 'plus': plus / atr, 'minus': minus / atr}, period, index)
+        rsi_values = 100 - (100 / (1 + smoothed['gain'] / smoothed['loss']))
+        di_plus = 100 * smoothed['plus']
+        di_minus = 100 * smoothed['minus']
+        dx = (np.abs(di_plus - di_minus) / (di_plus + di_minus)).rename('dx')
+    adx_values = 100 * _ewm({'dx': dx}, period, index)['dx']
+
+    # RSI
+    rsi = pd.DataFrame({'{} period RSI'.format(period): rsi_values}).dropna()
+    rsi_column = rsi.iloc[:, 0].to_numpy()
+    rsi['bounds'] = np.select([rsi_column <= rsi_bounds[0], rsi_column >= rsi_bounds[1]], [-1, 1], 0)
+
+    # OBV only exists on days the close moved, the rest are dropped
+    signed_volume = np.where(delta > 0, volume, np.where(delta < 0, -volume, np.nan))
+    moved = ~np.isnan(signed_volume)
+    obv_values = np.cumsum(signed_volume[moved])
+    obv = pd.DataFrame({'OBV': obv_values[1:], 'diff': np.diff(obv_values)}, index=index[moved][1:])
+    obv['bounds'] = np.sign(obv['diff'].to_numpy()).astype(np.int64)
+
+    # DMI
+    dmi = pd.DataFrame({'DI+': di_plus, 'DI-': di_minus}).dropna()
+    dmi['dmi_bounds'] = np.sign(dmi['DI+'].to_numpy() - dmi['DI-'].to_numpy()).astype(np.int64)
+
+    # ADX, its strength level (0-3) times the DMI direction
+    adx = dmi.copy()
+    adx['{} period ADX.'.format(period)] = adx_values
+    adx = adx.dropna()
+    adx_column = adx.iloc[:, -1].to_numpy()
+    level = sum((adx_column > threshold).astype(np.int64) for threshold in adx_levels)
+    adx['bounds'] = level * adx['dmi_bounds'].to_numpy()
+
+    return {'rsi': rsi, 'obv': obv, 'dmi': dmi, 'adx': adx}
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+
+# in lean mode a float price column is stored as float32 when no value moves by more than this
+# (half a cent) on the way there and back, otherwise it stays float64
+PRICE_TOLERANCE = 0.005
+
+
+def compact_prices(df, tolerance=PRICE_TOLERANCE):
+    # float columns to float32 where precision allows and integer columns (volume from yfinance)
+    # to the smallest integer type that holds them
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if pd.api.types.is_float_dtype(values):
+            small = values.astype(np.float32)
+            # nan - nan is nan and never over the tolerance
+            if not (np.abs(small.to_numpy(dtype=float) - values.to_numpy(dtype=float)) > tolerance).any():
+                values = small
+        elif pd.api.types.is_integer_dtype(values):
+            values = pd.to_numeric(values, downcast='integer')
+        columns[name] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def compact_bounds(bounds):
+    # bounds are small whole numbers (-3..3, or -999 for nothing known yet) so int8/int16
+    # instead of int64, or the float ffill leaves behind
+    return pd.to_numeric(bounds, downcast='integer')
+
+
+def footprint(value):
+    # deep size in bytes of the frames/series/arrays in value, dicts and lists are walked
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(footprint(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(footprint(v) for v in value)
+    return 0
@@ -0,0 +1,198 @@
+import contextlib
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # resource is unix only, the rss high-water mark is skipped on windows
+    resource = None
+
+
+# where Stock writes <ticker>.json and <ticker>.trace.json when instrumented
+METRICS_PATH = os.getcwd()+'/reports/metrics'
+
+# handed out instead of a stage when instrumentation is off, so the hot path is one None check
+NO_SPAN = contextlib.nullcontext()
+
+
+# how a stage's peak memory is measured:
+#   'rss'     the process' resident peak during the stage. linux lets us reset the high-water mark
+#             per stage, elsewhere it is the high-water mark of the whole run so far. costs nothing
+#   'python'  the most python (and numpy) memory allocated above what was allocated when the stage
+#             started, with tracemalloc. more precise but slows allocation heavy stages down a lot
+MEMORY_MODES = ('rss', 'python')
+
+# writing 5 here resets VmHWM in /proc/self/status (linux only)
+CLEAR_REFS = '/proc/self/clear_refs'
+STATUS = '/proc/self/status'
+# resident pages are the second field (linux only)
+STATM = '/proc/self/statm'
+
+
+def peak_rss_mb():
+    # the process' resident high-water mark so far
+    if resource is None:
+        return float("nan")
+    # ru_maxrss is in kilobytes on linux and bytes on mac
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def rss_mb():
+    # the process' resident size right now. without /proc the high-water mark so far stands in
+    try:
+        with open(STATM) as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def reset_rss_peak():
+    # True if the high-water mark could be reset
+    try:
+        with open(CLEAR_REFS, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def rss_high_water_mb():
+    # VmHWM follows resets, ru_maxrss doesn't
+    try:
+        with open(STATUS) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def row_count(value):
+    # rows of a frame/series, None for anything else (or nothing)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+class RunMetrics:
+    # wall time, cpu time, peak memory (see MEMORY_MODES) and rows in/out for every stage of one run.
+    # cpu time is this process only, work handed to sentiment/render worker processes isn't in it
+    def __init__(self, name, memory='rss') -> None:
+        if memory not in MEMORY_MODES:
+            raise ValueError("memory must be one of {}".format(", ".join(MEMORY_MODES)))
+        self.name = name
+        self.memory = memory
+        self.started = datetime.datetime.now()
+        self.pid = os.getpid()
+        self.stages = []
+        self._origin = time.perf_counter()
+        self._open = []
+        self._owns_tracing = False
+
+    def _current_peak(self):
+        if self.memory == 'python':
+            return tracemalloc.get_traced_memory()[1]
+        return rss_high_water_mb()
+
+    def _reset_peak(self):
+        if self.memory == 'python':
+            tracemalloc.reset_peak()
+        else:
+            reset_rss_peak()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        # time the block. yields the stage's record so rows_in/rows_out can be filled in once known.
+        # stages can nest (a stage pulling in another one, or a span inside a stage)
+        record = {
+            "name": name, "depth": len(self._open), "rows_in": rows_in, "rows_out": None,
+            "start": time.perf_counter() - self._origin, "thread": threading.get_ident(),
+        }
+
+        if self.memory == 'python' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+        if self._open:
+            # the stage we are inside keeps its peak so far, then the counter starts over for this one
+            self._open[-1]["_peak"] = max(self._open[-1]["_peak"], self._current_peak())
+        self._reset_peak()
+        record["_base"] = tracemalloc.get_traced_memory()[0] if self.memory == 'python' else 0
+        record["_peak"] = self._current_peak()
+
+        self._open.append(record)
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall"] = time.perf_counter() - wall
+            record["cpu"] = time.process_time() - cpu
+            self._open.pop()
+
+            peak = max(record.pop("_peak"), self._current_peak())
+            record["peak_memory_mb"] = peak - record.pop("_base")
+            if self.memory == 'python':
+                record["peak_memory_mb"] /= 1024 * 1024
+            if self._open:
+                self._open[-1]["_peak"] = max(self._open[-1]["_peak"], peak)
+            elif self._owns_tracing:
+                tracemalloc.stop()
+                self._owns_tracing = False
+            self.stages.append(record)
+
+    def summary(self):
+        # one row per stage in the order they started
+        columns = ["name", "depth", "wall", "cpu", "peak_memory_mb", "rows_in", "rows_out"]
+        return pd.DataFrame(sorted(self.stages, key=lambda r: r["start"]), columns=columns)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started": self.started.isoformat(),
+            "pid": self.pid,
+            "memory": self.memory,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": sorted(self.stages, key=lambda r: r["start"]),
+        }
+
+    def trace_events(self):
+        # complete ("X") events in microseconds, open the file in chrome://tracing or perfetto
+        events = [{
+            "name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": self.name},
+        }]
+        for record in self.stages:
+            events.append({
+                "name": record["name"], "cat": "stage", "ph": "X", "pid": self.pid, "tid": record["thread"],
+                "ts": round(record["start"] * 1e6), "dur": round(record["wall"] * 1e6),
+                "args": {key: record[key] for key in ("cpu", "peak_memory_mb", "rows_in", "rows_out")},
+            })
+        return events
+
+    def save_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def save_trace(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        return path
+
+    def save(self, directory=METRICS_PATH, trace=True):
+        # <name>.json and (with trace) <name>.trace.json in directory
+        os.makedirs(directory, exist_ok=True)
+        paths = [self.save_json(os.path.join(directory, "{}.json".format(self.name)))]
+        if trace:
+            paths.append(self.save_trace(os.path.join(directory, "{}.trace.json".format(self.name))))
+        return paths
@@ -0,0 +1,226 @@
+import sys
+import numpy as np
+import pandas as pd
+from forward_returns import horizon_column, QUANTILES, STAT_COLUMNS
+from indicators import compute_indicators
+from recommendations import encode_recommendations
+from align import TradingCalendar, band, MAX_STALENESS
+from dedup import representatives, DEDUP_HEADLINES
+
+
+# signals compared across tickers and the bounds the report looks at for each
+SIGNAL_BOUNDS = {
+    'RSI': [-1, 1],
+    'OBV': [-1, 1],
+    'ADX': [-3, -2, -1, 1, 2, 3],
+    'Headlines': [-1, 1],
+    'Analysts': [-1, 1],
+}
+
+# same horizons as base.periods
+HORIZONS = [1, 3, 7, 14, 21, 28]
+
+# where python panel.py writes the comparison table
+PANEL_PATH = "reports/panel_stats.csv"
+
+
+def price_panel(price_store, tickers, refresh=False):
+    # every ticker's price history stacked on a (Ticker, Date) index.
+    # refresh=False only downloads tickers that have nothing stored
+    frames = {}
+    for ticker in tickers:
+        frames[ticker] = price_store.history(ticker, refresh=refresh)
+    return pd.concat(frames, names=['Ticker', 'Date'])
+
+
+def indicator_signals(prices):
+    # the RSI/OBV/ADX bounds of every ticker, lined up with the price panel (nan over the
+    # warm up rows the indicators don't cover). they are recursive so this is done ticker by ticker
+    columns = {'RSI': [], 'OBV': [], 'ADX': []}
+    for _, history in prices.groupby(level='Ticker', sort=False):
+        history = history.droplevel('Ticker')
+        indicators = compute_indicators(history)
+        for name, key in (('RSI', 'rsi'), ('OBV', 'obv'), ('ADX', 'adx')):
+            columns[name].append(indicators[key]['bounds'].reindex(history.index).to_numpy(dtype=float))
+    return pd.DataFrame({name: np.concatenate(values) for name, values in columns.items()}, index=prices.index)
+
+
+def event_signal(events, prices, max_staleness=MAX_STALENESS, market_time='Close'):
+    # a (Ticker, Date, Value) frame of events onto the price panel the way Stock does it: each ticker's
+    # events are snapped onto its own trading calendar and carried forward, -999 while nothing is known
+    values = np.full(len(prices), -999.0)
+    by_ticker = dict(tuple(events.groupby('Ticker', sort=False)))
+    codes = prices.index.codes[0]
+    for code, ticker in enumerate(prices.index.levels[0]):
+        ticker_events = by_ticker.get(ticker)
+        rows = np.flatnonzero(codes == code)
+        if ticker_events is None or len(rows) == 0:
+            continue
+        calendar = TradingCalendar(prices.index.get_level_values('Date')[rows], market_time)
+        values[rows] = band(calendar.align(ticker_events['Date'], ticker_events['Value'], max_staleness))
+    return pd.Series(values, index=prices.index)
+
+
+def headline_signal(text_store, sentiment_engine, prices, max_staleness=MAX_STALENESS, dedup=DEDUP_HEADLINES):
+    # every ticker's headlines come out of the store in one scan and get scored in one go. with
+    # dedup only one headline per cluster of a ticker's near duplicates is scored and counted
+    tickers = prices.index.get_level_values('Ticker').unique()
+    headlines = text_store.query('headlines', tickers=tickers)
+    if dedup:
+        headlines = representatives(headlines, by='Ticker')
+    headlines['Value'] = sentiment_engine.score(headlines['Headline'])
+    return event_signal(headlines, prices, max_staleness)
+
+
+def analyst_signal(text_store, rules, prices, max_staleness=MAX_STALENESS):
+    tickers = prices.index.get_level_values('Ticker').unique()
+    analysts = text_store.query('analysts', tickers=tickers)
+    analysts['Value'], _ = encode_recommendations(analysts['Recommendation'], rules)
+    return event_signal(analysts, prices, max_staleness)
+
+
+def forward_returns(prices, horizons=HORIZONS, market_time='Close', rows=None):
+    # the forward return over every horizon within each ticker, on the panel's rows. like
+    # forward_return_frame the shift skips bars missing a high/low/close, and with rows (a mask)
+    # every other bar too. those rows stay nan
+    valid = prices[['High', 'Low', 'Close']].notna().all(axis=1).to_numpy()
+    if rows is not None:
+        valid &= rows
+    price = prices[market_time].to_numpy(dtype=float)[valid]
+    ticker = prices.index.codes[0][valid]
+
+    columns = {}
+    for days in horizons:
+        change = np.full(len(price), np.nan)
+        if days < len(price):
+            # only where the bar days ahead still belongs to the same ticker
+            same = ticker[days:] == ticker[:-days]
+            change[:-days] = np.where(same, price[days:] - price[:-days], np.nan)
+        for percent, values in ((False, change), (True, change / price * 100)):
+            column = np.full(len(prices), np.nan)
+            column[valid] = values
+            columns[horizon_column(days, percent)] = column
+    return pd.DataFrame(columns, index=prices.index)
+
+
+def has_gaps(values, prices):
+    # True if a signal has no value on some bar (with a price) after one it does have a value on,
+    # within a ticker. OBV has none on days the close didn't move
+    valid = prices[['High', 'Low', 'Close']].notna().all(axis=1).to_numpy()
+    present = ~np.isnan(values[valid])
+    ticker = prices.index.codes[0][valid]
+    return bool((present[:-1] & ~present[1:] & (ticker[:-1] == ticker[1:])).any())
+
+
+def signal_returns(signals, prices, horizons=HORIZONS, market_time='Close'):
+    # Stock shifts a signal's forward returns over only the bars that have a value for it. for a
+    # signal with one on every bar after its warm up that is the same as the shared returns, a
+    # signal with gaps gets its own '<signal> <column>' returns, shifted over its own bars
+    own = []
+    for name in signals:
+        values = signals[name].to_numpy(dtype=float)
+        if has_gaps(values, prices):
+            returns = forward_returns(prices, horizons, market_time, rows=~np.isnan(values))
+            own.append(returns.add_prefix('{} '.format(name)))
+    return own
+
+
+def build_panel(tickers, price_store, text_store=None, sentiment_engine=None, analyst_rules=None,
+                horizons=HORIZONS, market_time='Close', refresh=False, max_staleness=MAX_STALENESS,
+                dedup_headlines=DEDUP_HEADLINES):
+    # one (Ticker, Date) frame with prices, each signal's bound and the forward returns (plus
+    # a signal's own returns where it has gaps, see signal_returns).
+    # headline/analyst signals are only added when there is a store (and a scorer/rules) for them.
+    # only rows with every shared forward return are kept, like forward_return_frame. a signal's
+    # own returns reach further ahead so its complete rows are always among those
+    prices = price_panel(price_store, tickers, refresh)
+    signals = [indicator_signals(prices)]
+    if text_store is not None and sentiment_engine is not None:
+        signals.append(headline_signal(
+            text_store, sentiment_engine, prices, max_staleness, dedup_headlines
+        ).rename('Headlines'))
+    if text_store is not None and analyst_rules is not None:
+        signals.append(analyst_signal(text_store, analyst_rules, prices, max_staleness).rename('Analysts'))
+    signals = pd.concat(signals, axis=1, copy=False)
+    returns = forward_returns(prices, horizons, market_time)
+
+    # every part shares the price index so they go side by side without aligning
+    parts = [prices[['High', 'Low', 'Close']], signals, returns] + signal_returns(signals, prices, horizons, market_time)
+    panel = pd.concat(parts, axis=1, copy=False)
+    return panel[returns.notna().all(axis=1).to_numpy()]
+
+
+def panel_stats(panel, horizons=HORIZONS, signals=None, quantiles=QUANTILES):
+    # the forward return stats for every ticker, signal, bound and horizon in one grouped pass.
+    # same columns as forward_return_stats with Signal and Ticker in front
+    signals = signals if signals is not None else [s for s in SIGNAL_BOUNDS if s in panel]
+    columns = [horizon_column(days, percent) for percent in (False, True) for days in horizons]
+    returns = panel[columns].reset_index(drop=True)
+    ticker = panel.index.get_level_values('Ticker')
+
+    # one block of rows per signal, only the days it sat on a bound we compare. a signal with its
+    # own returns only counts the rows they are complete on
+    blocks = []
+    for signal in signals:
+        values = panel[signal].to_numpy()
+        on_bound = np.isin(values, SIGNAL_BOUNDS[signal])
+        own = ['{} {}'.format(signal, column) for column in columns]
+        frame = returns
+        if own[0] in panel:
+            frame = panel[own].set_axis(columns, axis=1).reset_index(drop=True)
+            on_bound &= frame.notna().all(axis=1).to_numpy()
+        blocks.append(frame[on_bound].assign(
+            Signal=signal, Ticker=ticker[on_bound], Bound=values[on_bound].astype(int)
+        ))
+    rows = pd.concat(blocks, ignore_index=True)
+
+    grouped = rows.groupby(['Signal', 'Ticker', 'Bound'], sort=False)[columns]
+    stats = grouped.agg(STAT_COLUMNS).stack(level=0)
+
+    # all quantiles come out of a single sort of every group
+    quantile_names = ['q{:g}'.format(q*100) for q in quantiles]
+    by_quantile = grouped.quantile(quantiles).stack().unstack(level=3)
+    by_quantile.columns = quantile_names
+    stats = stats.join(by_quantile)
+    stats.index.names = ['Signal', 'Ticker', 'Bound', 'Column']
+
+    # every ticker gets a row for every bound, bounds that never happened have a count of 0
+    tickers = ticker.unique()
+    full_index = pd.MultiIndex.from_tuples(
+        [(signal, name, bound, column)
+         for signal in signals for name in tickers
+         for bound in SIGNAL_BOUNDS[signal] for column in columns],
+        names=stats.index.names
+    )
+    stats = stats.reindex(full_index)
+    stats['count'] = stats['count'].fillna(0).astype(int)
+
+    stats = stats.reset_index()
+    stats.insert(4, 'Horizon', stats['Column'].str.split('-').str[0].astype(int))
+    stats.insert(5, 'Measure', np.where(stats['Column'].str.endswith('%'), 'pct', 'abs'))
+    return stats[['Signal', 'Ticker', 'Bound', 'Horizon', 'Measure', 'Column'] + STAT_COLUMNS + quantile_names]
+
+
+def compare(stats, stat='mean', measure='pct'):
+    # the comparison table: a row per signal/bound/horizon and a column per ticker
+    stats = stats[stats['Measure'] == measure]
+    return stats.pivot_table(index=['Signal', 'Bound', 'Horizon'], columns='Ticker', values=stat, sort=False)
+
+
+if __name__ == "__main__":
+    # python panel.py [tickers]  stats for every ticker (TICKER_LIST by default) in one table
+    from base import TICKER_LIST, mypath
+    from prices import PriceStore
+    from store import TextStore
+    from sentiment import SentimentEngine, SentimentCache
+    from recommendations import load_rules
+
+    tickers = sys.argv[1:] or TICKER_LIST
+    panel = build_panel(
+        tickers, PriceStore(mypath+'/prices'), TextStore(mypath+'/store'),
+        SentimentEngine(cache=SentimentCache(mypath+'/cache/sentiment')), load_rules()
+    )
+    stats = panel_stats(panel)
+    stats.to_csv(PANEL_PATH, index=False)
+    print("Wrote stats for {} tickers to {}".format(len(tickers), PANEL_PATH))
+    print(compare(stats).round(2).to_string())
@@ -0,0 +1,123 @@
+import abc
+import os
+import pandas as pd
+import yfinance as yf
+
+
+# where the local price partitions live, one parquet file per ticker
+PRICE_PATH = os.getcwd()+'/prices'
+
+# if the overlapping bar moved more than this the history was re-adjusted (split/dividend)
+ADJUSTMENT_TOLERANCE = 1e-4
+
+
+class PriceProvider(abc.ABC):
+    # anything that can hand back OHLCV history with a naive DatetimeIndex.
+    # start=None means the full history
+    @abc.abstractmethod
+    def history(self, ticker, start=None):
+        pass
+
+
+class YFinanceProvider(PriceProvider):
+    def history(self, ticker, start=None):
+        stock = yf.Ticker(ticker)
+        if start is None:
+            df = stock.history(period="max")
+        else:
+            df = stock.history(start=pd.Timestamp(start).strftime("%Y-%m-%d"))
+
+        # Love new updates... this fixes localized datetime
+        df.index = df.index.tz_localize(None)
+        return df
+
+
+class FileProvider(PriceProvider):
+    # reads <path>/<ticker>.csv (or .parquet), used as a stand in for yfinance offline and in tests
+    def __init__(self, path) -> None:
+        self.path = path
+
+    def history(self, ticker, start=None):
+        parquet_file = os.path.join(self.path, "{}.parquet".format(ticker))
+        if os.path.isfile(parquet_file):
+            df = pd.read_parquet(parquet_file)
+        else:
+            df = pd.read_csv(os.path.join(self.path, "{}.csv".format(ticker)), index_col=0, parse_dates=True)
+
+        if df.index.tz is not None:
+            df.index = df.index.tz_localize(None)
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+        return df
+
+
+class PriceStore:
+    def __init__(self, path=PRICE_PATH, provider=None) -> None:
+        self.path = path
+        self.provider = provider if provider is not None else YFinanceProvider()
+
+    def file_name(self, ticker):
+        return os.path.join(self.path, "{}.parquet".format(ticker))
+
+    def load(self, ticker, start=None, end=None):
+        # local read only, returns None if the ticker has never been stored
+        if not os.path.isfile(self.file_name(ticker)):
+            return None
+
+        filters = []
+        if start is not None:
+            filters.append(("Date", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("Date", "<=", pd.Timestamp(end)))
+        return pd.read_parquet(self.file_name(ticker), filters=filters or None)
+
+    def save(self, ticker, df):
+        os.makedirs(self.path, exist_ok=True)
+        df = df.copy()
+        df.index.name = "Date"
+
+        # write next to the partition and swap it in so readers never see half a file
+        temp_file = self.file_name(ticker) + ".tmp"
+        df.to_parquet(temp_file)
+        os.replace(temp_file, self.file_name(ticker))
+
+    def update(self, ticker):
+        # top up the stored history with any bars newer than the last stored one
+        stored = self.load(ticker)
+        if stored is None or stored.empty:
+            print("No local price history for {}, downloading everything".format(ticker))
+            full = self.provider.history(ticker)
+            self.save(ticker, full)
+            return full
+
+        # the last stored bar may have been a partial (intraday) bar, so it always gets replaced and
+        # the bar before it (which was complete when it was stored) is refetched as well to compare
+        last = stored.index[-1]
+        check = stored.index[-2] if len(stored) > 1 else last
+        new = self.provider.history(ticker, start=check)
+        new = new[new.index >= check]
+        if new.empty:
+            return stored
+
+        # adjusted prices change retroactively after a split or dividend, so start over
+        if check != last and check in new.index:
+            old_close = stored.at[check, "Close"]
+            new_close = new.at[check, "Close"]
+            if abs(new_close - old_close) > ADJUSTMENT_TOLERANCE * max(abs(old_close), 1):
+                print("Price history for {} was re-adjusted, downloading everything".format(ticker))
+                full = self.provider.history(ticker)
+                self.save(ticker, full)
+                return full
+
+        updated = pd.concat([stored[stored.index < new.index[0]], new])
+        print("Added {} new bars for {}".format(len(updated) - len(stored), ticker))
+        self.save(ticker, updated)
+        return updated
+
+    def history(self, ticker, refresh=True):
+        # refresh=False never touches the network unless nothing is stored yet
+        if not refresh:
+            stored = self.load(ticker)
+            if stored is not None:
+                return stored
+        return self.update(ticker)
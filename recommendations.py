@@ -0,0 +1,45 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+# value for a row when there is no recommendation to go on at all, like align.band's
+UNKNOWN = -999
+
+# default mapping from an analyst's recommendation wording to a value (-1, 0, 1)
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analyst_rules.json')
+
+
+def load_rules(path=RULES_PATH):
+    # rules file looks like {"default": 0, "values": {"to Buy": 1, "Hold to Sell": -1, ...}}
+    with open(path) as f:
+        rules = json.load(f)
+    rules.setdefault("default", 0)
+    rules.setdefault("values", {})
+    return rules
+
+
+def encode_recommendations(recommendations, rules):
+    # returns (value for every row, counts of the wordings that had no rule)
+    # every distinct wording is looked up once and the result is broadcast back with its category code
+    recommendations = pd.Categorical(recommendations)
+    if len(recommendations.categories) == 0:
+        # no analyst rows, or none of them parsed, so nothing is known
+        unmapped_counts = pd.Series([], index=pd.Index([], dtype=object), name="Count", dtype=np.int64)
+        return np.full(len(recommendations), UNKNOWN, dtype=np.int64), unmapped_counts
+
+    category_values = recommendations.categories.map(rules["values"]).to_numpy(dtype=float)
+
+    unmapped = np.isnan(category_values)
+    category_values[unmapped] = rules["default"]
+
+    codes = recommendations.codes
+    values = np.where(codes >= 0, category_values[codes], rules["default"]).astype(np.int64)
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(category_values))
+    unmapped_counts = pd.Series(
+        counts[unmapped], index=recommendations.categories[unmapped], name="Count", dtype=np.int64
+    ).sort_values(ascending=False)
+
+    return values, unmapped_counts
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import matplotlib.collections as collections
+import matplotlib.dates as mdates
+
+
+# a signal as runs of the same value: one row per run with the first and last date
+# it covers (inclusive), the value and how many rows it spans
+RUN_COLUMNS = ['start', 'end', 'value', 'length']
+
+
+def to_runs(signal):
+    # collapse a daily signal column into runs. rows with no value (nan) are not part of any run
+    values = signal.to_numpy(dtype=float)
+    if len(values) == 0:
+        return pd.DataFrame(columns=RUN_COLUMNS)
+
+    # a new run starts wherever the value changes. nan != nan so a gap always breaks a run
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    ends = np.concatenate((starts[1:], [len(values)])) - 1
+
+    runs = pd.DataFrame({
+        'start': signal.index[starts],
+        'end': signal.index[ends],
+        'value': values[starts],
+        'length': ends - starts + 1,
+    })
+    return runs[runs['value'].notna()].reset_index(drop=True)
+
+
+def from_runs(runs, index):
+    # expand runs back into a daily series over index, dates outside every run are nan
+    index = pd.DatetimeIndex(index)
+    out = np.full(len(index), np.nan)
+    if len(runs) == 0:
+        return pd.Series(out, index=index, name='value')
+    first = index.searchsorted(runs['start'].to_numpy(), side='left')
+    last = index.searchsorted(runs['end'].to_numpy(), side='right')
+
+    # runs don't overlap and are in order, so each date belongs to the last run starting before it
+    position = np.arange(len(index))
+    which = np.searchsorted(first, position, side='right') - 1
+    inside = (which >= 0) & (position < last[np.maximum(which, 0)])
+    out[inside] = runs['value'].to_numpy(dtype=float)[which[inside]]
+    return pd.Series(out, index=index, name='value')
+
+
+def clip_runs(runs, start, end):
+    # the part of every run that falls between start and end (inclusive)
+    clipped = runs[(runs['end'] >= start) & (runs['start'] <= end)].copy()
+    clipped['start'] = clipped['start'].where(clipped['start'] >= start, start)
+    clipped['end'] = clipped['end'].where(clipped['end'] <= end, end)
+    return clipped
+
+
+def regime_collection(runs, value, ymin, ymax, **kwargs):
+    # shaded boxes over every run of value, the same shapes BrokenBarHCollection.span_where
+    # drew from a daily mask but built straight from the runs
+    runs = runs[runs['value'] == value]
+    x = mdates.date2num(pd.DatetimeIndex(runs['start']).to_pydatetime())
+    x_end = mdates.date2num(pd.DatetimeIndex(runs['end']).to_pydatetime())
+    verts = [[(x0, ymin), (x0, ymax), (x1, ymax), (x1, ymin)] for x0, x1 in zip(x, x_end)]
+    return collections.PolyCollection(verts, **kwargs)
+
+
+def regime_durations(runs):
+    # how long each value tends to last, in rows and in calendar days
+    runs = runs.assign(days=(pd.DatetimeIndex(runs['end']) - pd.DatetimeIndex(runs['start'])).days + 1)
+    stats = runs.groupby('value').agg(
+        runs=('length', 'size'),
+        total_rows=('length', 'sum'),
+        mean_rows=('length', 'mean'),
+        median_rows=('length', 'median'),
+        max_rows=('length', 'max'),
+        mean_days=('days', 'mean'),
+        max_days=('days', 'max'),
+    )
+    stats['share'] = stats['total_rows'] / stats['total_rows'].sum()
+    return stats
+
+
+def regime_forward_returns(runs, price_history, horizons, market_time='Close'):
+    # for every run, the return from the first tradable bar of the run to horizon bars later
+    # and over the run itself. returns (per run table, per value summary)
+    price = price_history[market_time]
+    dates = price.index
+    values = price.to_numpy(dtype=float)
+
+    # runs can start on a weekend/holiday (headlines) so use the next bar that trades
+    first = dates.searchsorted(runs['start'].to_numpy(), side='left')
+    last = dates.searchsorted(runs['end'].to_numpy(), side='right') - 1
+    tradable = (first < len(dates)) & (last >= first)
+
+    per_run = runs.loc[tradable].reset_index(drop=True)
+    first = first[tradable]
+    last = last[tradable]
+    entry = values[first]
+
+    per_run['entry'] = entry
+    per_run['run_return'] = values[last] - entry
+    per_run['run_return %'] = per_run['run_return'] / entry * 100
+    for days in horizons:
+        target = first + days
+        exit_price = np.where(target < len(values), values[np.minimum(target, len(values) - 1)], np.nan)
+        per_run['{}-day'.format(days)] = exit_price - entry
+        per_run['{}-day %'.format(days)] = (exit_price - entry) / entry * 100
+
+    columns = ['run_return', 'run_return %'] + [
+        '{}-day{}'.format(days, suffix) for suffix in ('', ' %') for days in horizons
+    ]
+    summary = per_run.groupby('value')[columns].agg(['count', 'mean', 'min', 'max'])
+    return per_run, summary
@@ -0,0 +1,198 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+import matplotlib.pyplot as plt
+import regimes
+from regimes import clip_runs, regime_collection
+from artifacts import fingerprint
+
+
+# figure formats savefig can write for us
+RENDER_FORMATS = ('png', 'svg', 'webp')
+
+# the code a figure comes out of: the render_* functions, their helpers (_finish, _year_runs) and
+# the regime drawing. their whole source goes into every figure's fingerprint so editing any of
+# it redraws the figures
+RENDER_MODULES = (sys.modules[__name__], regimes)
+
+
+def _init_worker():
+    # workers only ever write files so use the non-interactive backend
+    matplotlib.use('Agg')
+
+
+def _finish(fig, title, path, dpi):
+    fig.suptitle(title)
+    fig.tight_layout(pad=1)
+    plt.close(fig)
+    # every figure is saved at the run's dpi, see base.DPI
+    fig.savefig(path, dpi=dpi)
+
+
+def _year_runs(dates, runs, year):
+    # runs cut down to the signal's rows in year, like slicing the signal to the year did
+    dates = dates[dates.year == year]
+    if len(dates) == 0:
+        return runs.iloc[:0]
+    return clip_runs(runs, dates[0], dates[-1])
+
+
+def render_total(path, dpi, price, high, runs, bounds_values, alpha_values, color, title):
+    fig, ax = plt.subplots()
+    ax.plot(price)
+    for num in range(len(bounds_values)):
+        collection = regime_collection(
+                        runs, bounds_values[num], 0,
+                        high.max(),
+                        facecolor=color[num], alpha=alpha_values[num]
+        )
+        ax.add_collection(collection)
+
+    _finish(fig, title, path, dpi)
+    return path
+
+
+def render_years(path, dpi, price, high, dates, runs, bounds_values, alpha_values, color, title):
+    beginning = dates[0].year
+    end = dates[-1].year
+
+    # capped to fit on a word page
+    total_rows = 10
+
+    columns = int(round(((end-beginning)/total_rows)+0.5))
+    rows = int(round(((end-beginning)/columns)+0.5))
+    fig, ax = plt.subplots(rows,columns)
+    if (end-beginning) < total_rows:
+        for year in range(end-beginning):
+            ax[year].plot(price.loc[str(year+beginning):str(year+beginning)])
+            year_runs = _year_runs(dates, runs, year+beginning)
+            for num in range(len(bounds_values)):
+                collection = regime_collection(
+                    year_runs, bounds_values[num], 0,
+                    high.loc[str(year+beginning):str(year+beginning)].max(),
+                    facecolor=color[num], alpha=alpha_values[num]
+                )
+                ax[year].add_collection(collection)
+                ax[year].tick_params(labelrotation=45)
+
+    else:
+        count = 0
+        for col in range(columns):
+            for r in range(rows):
+                ax[r][col].plot(price.loc[str(count+beginning):str(count+beginning)])
+                year_runs = _year_runs(dates, runs, count+beginning)
+                for num in range(len(bounds_values)):
+                    collection = regime_collection(
+                        year_runs, bounds_values[num], 0,
+                        high.loc[str(count+beginning):str(count+beginning)].max(),
+                        facecolor=color[num], alpha=alpha_values[num]
+                    )
+                    ax[r][col].add_collection(collection)
+                    ax[r][col].tick_params(labelrotation=45)
+                count += 1
+                if count >(end-beginning):
+                    break
+
+    if columns == 1:
+        fig.set_size_inches(6.5,(end-beginning))
+    else:
+        fig.set_size_inches(6.5,1.5*(end-beginning)/columns)
+    _finish(fig, title, path, dpi)
+    return path
+
+
+def render_shift(path, dpi, returns, title):
+    # returns is the forward return columns for the days a bound was active
+    fig, ax = plt.subplots(sharex=True)
+    fig.tight_layout()
+    fig.set_size_inches(6.5,9)
+    returns.plot(
+        kind='line',
+        subplots=True,
+        lw=0.5,
+        title=title,
+        legend=True,
+        ax=ax
+    )
+    plt.close(fig)
+    fig.savefig(path, dpi=dpi)
+    return path
+
+
+class FigureRenderer:
+    # queue of independent figure jobs. workers=1 renders in this process as jobs come in,
+    # more workers hand them to a process pool. enabled=False skips figures completely
+    def __init__(self, workers=None, dpi=100, fig_format='png', enabled=True, cache=None) -> None:
+        if fig_format not in RENDER_FORMATS:
+            raise ValueError("fig_format must be one of {}".format(", ".join(RENDER_FORMATS)))
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.dpi = dpi
+        self.fig_format = fig_format
+        self.enabled = enabled
+
+        # optional ArtifactCache, figures whose inputs haven't changed are not drawn again
+        self.cache = cache
+
+        self.pool = None
+        self.pending = []
+        # requested name -> file actually written
+        self.outputs = {}
+        self.fingerprints = {}
+
+    def output_path(self, name):
+        # callers ask for name.png, the file gets whichever format this run renders
+        return os.path.splitext(name)[0] + '.' + self.fig_format
+
+    def submit(self, render, name, *args):
+        if not self.enabled:
+            return None
+
+        path = self.output_path(name)
+        self.outputs[name] = path
+
+        reason = None
+        if self.cache is not None:
+            path_fingerprint = fingerprint(render, RENDER_MODULES, matplotlib.__version__, self.dpi, self.fig_format, args)
+            self.fingerprints[path] = path_fingerprint
+            reusable, reason = self.cache.check(path, path_fingerprint)
+            if reusable:
+                self.cache.reuse(path)
+                return path
+
+        if self.workers <= 1:
+            render(path, self.dpi, *args)
+            self.built(path, reason)
+            return path
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        self.pending.append((path, reason, self.pool.submit(render, path, self.dpi, *args)))
+        return path
+
+    def built(self, path, reason):
+        if self.cache is not None:
+            self.cache.record(path, self.fingerprints[path], reason)
+
+    def wait(self):
+        # block until every queued figure is written, re-raising the first failure
+        pending, self.pending = self.pending, []
+        error = None
+        try:
+            for path, reason, future in pending:
+                try:
+                    future.result()
+                    self.built(path, reason)
+                except Exception as e:
+                    error = error or e
+                    if self.cache is not None:
+                        self.cache.forget(path)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+            if self.cache is not None:
+                self.cache.save()
+        if error is not None:
+            raise error
+        return self.outputs
@@ -0,0 +1,88 @@
+import io
+import sys
+from docx.shared import Inches
+from PIL import Image
+
+
+# resolution figures are resampled to for the printed size in the report
+REPORT_DPI = 200
+
+# the code the report is built from besides Stock's own methods: the figure and table helpers
+# and theirs (printed_size, format_cell). the whole source goes into the report's fingerprint
+REPORT_MODULES = (sys.modules[__name__],)
+
+# widest a figure can be printed on a letter page with the default margins
+PAGE_WIDTH = 6.5
+
+
+def printed_size(image, width=None, height=None):
+    # the size (in inches) docx would print the image at, keeping its aspect ratio
+    image_dpi = image.info.get('dpi', (72, 72))[0] or 72
+    native_width = image.width / image_dpi
+    aspect = image.height / image.width
+    if width is not None:
+        return width, width * aspect
+    if height is not None:
+        return height / aspect, height
+    width = min(native_width, PAGE_WIDTH)
+    return width, width * aspect
+
+
+def compact_image(path, width=None, height=None, dpi=REPORT_DPI):
+    # resample a (600+ DPI) figure down to what the page can show and recompress it.
+    # plots only use a handful of colours so an adaptive palette png loses nothing visible
+    with Image.open(path) as image:
+        inches_wide, inches_high = printed_size(image, width, height)
+        pixels = (max(1, int(round(inches_wide * dpi))), max(1, int(round(inches_high * dpi))))
+
+        image = image.convert('RGB')
+        if pixels[0] < image.width:
+            # a cheap whole-number box reduction first, then a proper resample for the rest
+            factor = image.width // pixels[0]
+            if factor > 1:
+                image = image.reduce(factor)
+            image = image.resize(pixels, Image.LANCZOS)
+        image = image.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+
+        stream = io.BytesIO()
+        image.save(stream, format='PNG', dpi=(dpi, dpi))
+    stream.seek(0)
+    return stream, Inches(inches_wide)
+
+
+def add_figure(document, path, width=None, height=None, dpi=REPORT_DPI):
+    # width/height are in inches like the old add_picture(..., height=Inches(9)) calls
+    stream, printed_width = compact_image(path, width, height, dpi)
+    return document.add_picture(stream, width=printed_width)
+
+
+def format_cell(value):
+    if type(value) == str:
+        return value
+    try:
+        return str(round(value,2))
+    except (TypeError, ValueError):
+        return 'NaN'
+
+
+def add_stats_table(document, stats, bounds):
+    # stats is the plotting_shift output ({bound}_min/_mean/_max series indexed by timeframe).
+    # the whole grid is created in one go and filled from the flat cell list instead of
+    # adding a row at a time, which python-docx makes quadratic
+    columns = [stats['{}_min'.format(bounds[0])].index.tolist()]
+    heading = ['Timeframe']
+    for bound in bounds:
+        for stat in ('min', 'mean', 'max'):
+            heading.append('{}_{}'.format(bound, stat))
+            columns.append(stats['{}_{}'.format(bound, stat)].tolist())
+
+    rows = [heading] + [[format_cell(column[i]) for column in columns] for i in range(len(columns[0]))]
+    table = document.add_table(len(rows), len(heading))
+    table.style = 'LightShading-Accent1'
+
+    cells = table._cells
+    width = len(heading)
+    for i, row in enumerate(rows):
+        for j, text in enumerate(row):
+            cells[i*width + j].text = text
+    return table
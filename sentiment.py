@@ -0,0 +1,187 @@
+import os
+import hashlib
+import glob
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import nltk
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+
+# number of headlines handed to a worker at once
+BATCH_SIZE = 2048
+
+# below this many unique headlines the process pool costs more than it saves
+MIN_PARALLEL = 4 * BATCH_SIZE
+
+# loading merges the cache's shards into one once there are more than this
+MAX_SHARDS = 16
+
+# bump whenever the way a headline becomes a score changes so cached scores are dropped
+SCORER_VERSION = 1
+
+# one analyzer per worker process, built by the pool initializer
+_worker_sid = None
+
+
+def _init_worker(lexicon_file):
+    global _worker_sid
+    _worker_sid = _make_analyzer(lexicon_file)
+
+
+def _score_batch(batch):
+    return [_worker_sid.polarity_scores(text)["compound"] for text in batch]
+
+
+def _make_analyzer(lexicon_file):
+    if lexicon_file is None:
+        return SentimentIntensityAnalyzer()
+    return SentimentIntensityAnalyzer(lexicon_file=lexicon_file)
+
+
+def headline_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SentimentCache:
+    # on disk map of headline hash -> compound score. every add writes its own shard,
+    # <version>-<pid>-<id>.csv, so parallel writers never touch the same file
+    def __init__(self, path) -> None:
+        self.path = path
+        self.version = None
+        self.scores = pd.Series(dtype=float)
+
+    def shard_files(self):
+        # the plain <version>.csv is what older runs appended to
+        return sorted(glob.glob(os.path.join(self.path, "{}*.csv".format(self.version))))
+
+    def read_shard(self, file):
+        try:
+            shard = pd.read_csv(file, index_col=None, dtype=str)
+        except FileNotFoundError:
+            # merged into a bigger shard by another process
+            return None
+        except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError):
+            shard = None
+        if shard is None or not {"Key", "Compound"} <= set(shard.columns):
+            # can't be read, drop it and rescore what was in it
+            print("Dropping unreadable sentiment cache {}".format(file))
+            self.remove(file)
+            return None
+
+        # rows that aren't a key and a score (like a second header) are skipped
+        shard["Compound"] = pd.to_numeric(shard["Compound"], errors="coerce")
+        return shard.dropna(subset=["Key", "Compound"])[["Key", "Compound"]]
+
+    def remove(self, file):
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+
+    def load(self, version):
+        if self.version == version:
+            return self.scores
+
+        # other versions' files are left alone, another checkout may still be scoring with them
+        self.version = version
+        os.makedirs(self.path, exist_ok=True)
+
+        files = self.shard_files()
+        shards = [self.read_shard(file) for file in files]
+        read = [file for file, shard in zip(files, shards) if shard is not None]
+        shards = [shard for shard in shards if shard is not None]
+        if not shards:
+            self.scores = pd.Series(dtype=float)
+            return self.scores
+
+        cached = pd.concat(shards, ignore_index=True).drop_duplicates("Key", keep="last")
+        self.scores = cached.set_index("Key")["Compound"]
+
+        if len(read) > MAX_SHARDS:
+            # fold the shards into one. the merged one is in place before any is removed and
+            # only shards that were read are removed, so a concurrent writer loses nothing
+            self.write_shard(cached)
+            for file in read:
+                self.remove(file)
+        return self.scores
+
+    def write_shard(self, df):
+        name = "{}-{}-{}".format(self.version, os.getpid(), uuid.uuid4().hex[:8])
+        shard_file = os.path.join(self.path, name + ".csv")
+
+        # written next to it and swapped in so readers never see half a shard
+        temp_file = shard_file + ".tmp"
+        df.to_csv(temp_file, index=False)
+        os.replace(temp_file, shard_file)
+
+    def lookup(self, keys):
+        # returns the cached score for each key, nan when it hasn't been scored yet
+        return self.scores.reindex(keys).to_numpy(dtype=float)
+
+    def add(self, keys, scores):
+        if len(keys) == 0:
+            return
+        new = pd.DataFrame({"Key": keys, "Compound": scores})
+        self.write_shard(new)
+        self.scores = pd.concat([self.scores, new.set_index("Key")["Compound"]])
+
+
+class SentimentEngine:
+    def __init__(self, workers=None, batch_size=BATCH_SIZE, lexicon_file=None, cache=None) -> None:
+        # workers=None uses every core, workers=1 keeps everything in this process
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.lexicon_file = lexicon_file
+        self.cache = cache
+
+        # the lexicon is only loaded once per engine instead of once per headline
+        self.sid = _make_analyzer(lexicon_file)
+
+        # identifies the scorer so cached scores from another lexicon or nltk are not reused
+        version = hashlib.blake2b(digest_size=8)
+        version.update("{}|{}|".format(SCORER_VERSION, nltk.__version__).encode("utf-8"))
+        version.update(self.sid.lexicon_file.encode("utf-8"))
+        self.version = version.hexdigest()
+
+    def score(self, headlines):
+        # returns the VADER compound score for every headline, in order
+        headlines = pd.Series(headlines, dtype=object).astype(str)
+        if len(headlines) == 0:
+            return np.array([], dtype=float)
+
+        # syndicated headlines are repeated a lot so only score each text once
+        codes, unique = pd.factorize(headlines)
+
+        if self.cache is None:
+            unique_scores = np.asarray(self.score_unique(list(unique)), dtype=float)
+            return unique_scores[codes]
+
+        # only score the headlines the cache hasn't seen before
+        self.cache.load(self.version)
+        keys = [headline_key(text) for text in unique]
+        unique_scores = self.cache.lookup(keys)
+        missing = np.flatnonzero(np.isnan(unique_scores))
+        if len(missing):
+            new_scores = np.asarray(self.score_unique([unique[i] for i in missing]), dtype=float)
+            unique_scores[missing] = new_scores
+            self.cache.add([keys[i] for i in missing], new_scores)
+
+        return unique_scores[codes]
+
+    def score_unique(self, texts):
+        batches = [texts[i:i+self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+        if self.workers <= 1 or len(texts) < MIN_PARALLEL:
+            scores = []
+            for batch in batches:
+                scores.extend(self.sid.polarity_scores(text)["compound"] for text in batch)
+            return scores
+
+        workers = min(self.workers, len(batches))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.lexicon_file,)) as pool:
+            scores = []
+            for batch_scores in pool.map(_score_batch, batches):
+                scores.extend(batch_scores)
+        return scores
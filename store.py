@@ -0,0 +1,141 @@
+import glob
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dates import normalize_dates
+
+
+# where the headline/analyst tables live. each table is a parquet dataset partitioned by
+# ticker (<table>/Ticker=<ticker>/data.parquet) so one ticker is rewritten without touching the rest
+STORE_PATH = os.getcwd()+'/store'
+
+# table: (columns in order, columns that identify a row, text columns).
+# rows are unique on the ticker plus the key columns, a rescrape never adds a duplicate
+TABLES = {
+    'headlines': (['Date', 'Headline'], ['Date', 'Headline'], ['Headline']),
+    'analysts': (['Change', 'Analyst', 'Recommendation', 'Date'],
+                 ['Date', 'Analyst', 'Change', 'Recommendation'], ['Change', 'Analyst', 'Recommendation']),
+}
+
+# rows per parquet row group. the date min/max of every group is in the footer, so a date
+# range only reads the groups that overlap it
+ROW_GROUP_SIZE = 4096
+
+
+class TextStore:
+    def __init__(self, path=STORE_PATH) -> None:
+        self.path = path
+
+    def table_path(self, table):
+        if table not in TABLES:
+            raise ValueError("table must be one of {}".format(", ".join(TABLES)))
+        return os.path.join(self.path, table)
+
+    def file_name(self, table, ticker):
+        return os.path.join(self.table_path(table), "Ticker={}".format(ticker), "data.parquet")
+
+    def tickers(self, table):
+        return sorted(
+            os.path.basename(os.path.dirname(f)).split('=', 1)[1]
+            for f in glob.glob(os.path.join(self.table_path(table), "Ticker=*", "data.parquet"))
+        )
+
+    def _filters(self, start, end):
+        filters = []
+        if start is not None:
+            filters.append(("Date", ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append(("Date", "<=", pd.Timestamp(end)))
+        return filters or None
+
+    def load(self, table, ticker, start=None, end=None):
+        # one ticker, newest first like the scrapers return it. None if it was never stored
+        if not os.path.isfile(self.file_name(table, ticker)):
+            return None
+        return pd.read_parquet(self.file_name(table, ticker), filters=self._filters(start, end))
+
+    def query(self, table, tickers=None, start=None, end=None):
+        # every (or the given) ticker in one dataset scan with a Ticker column. partitions of
+        # other tickers are skipped from their directory name and dates by the row group stats
+        if not os.path.isdir(self.table_path(table)):
+            return pd.DataFrame(columns=['Ticker'] + TABLES[table][0])
+        dataset = ds.dataset(self.table_path(table), format='parquet', partitioning='hive')
+        condition = None
+        if tickers is not None:
+            condition = ds.field('Ticker').isin(list(tickers))
+        if start is not None:
+            condition = _and(condition, ds.field('Date') >= pd.Timestamp(start))
+        if end is not None:
+            condition = _and(condition, ds.field('Date') <= pd.Timestamp(end))
+        df = dataset.to_table(filter=condition).to_pandas()
+        df['Ticker'] = df['Ticker'].astype(str)
+        return df[['Ticker'] + TABLES[table][0]]
+
+    def save(self, table, ticker, df):
+        columns = TABLES[table][0]
+        df = df[columns].reset_index(drop=True)
+        os.makedirs(os.path.dirname(self.file_name(table, ticker)), exist_ok=True)
+
+        # write next to the partition and swap it in so readers never see half a file
+        temp_file = self.file_name(table, ticker) + ".tmp"
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temp_file, row_group_size=ROW_GROUP_SIZE)
+        os.replace(temp_file, self.file_name(table, ticker))
+
+    def append(self, table, ticker, df):
+        # add rows for ticker, skipping any already stored (or repeated in df).
+        # returns the rows that were new
+        columns, key, text = TABLES[table]
+        df = df[columns].copy()
+        for column in text:
+            df[column] = df[column].astype(str).str.strip()
+        if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+            df['Date'] = normalize_dates(df['Date'])[0]
+
+        stored = self.load(table, ticker)
+        if stored is None:
+            stored = df.iloc[:0]
+
+        # a row is new if neither the store nor an earlier row of df has its key
+        seen = pd.concat([stored[key], df[key]], ignore_index=True).duplicated()
+        added = df[~seen.iloc[len(stored):].to_numpy()]
+
+        if len(added) or not os.path.isfile(self.file_name(table, ticker)):
+            # new rows go above stored ones from the same day, newest first overall
+            combined = pd.concat([added, stored], ignore_index=True)
+            self.save(table, ticker, combined.sort_values('Date', ascending=False, kind='stable'))
+        return added.reset_index(drop=True)
+
+    def import_csv(self, table, ticker, csv_file):
+        # bring one of the old headlines/ or analysts/ csvs into the store.
+        # returns (rows added, raw rows whose dates couldn't be parsed)
+        raw = pd.read_csv(csv_file, index_col=None, dtype=str)
+        dates, unparsed = normalize_dates(raw['Date'])
+        rows = raw.assign(Date=dates)[dates.notna()]
+        return self.append(table, ticker, rows), raw.loc[unparsed.index]
+
+    def import_directory(self, table, directory):
+        # one shot migration of every <ticker>.csv in directory
+        counts = {}
+        for csv_file in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+            ticker = os.path.splitext(os.path.basename(csv_file))[0]
+            added, unparsed = self.import_csv(table, ticker, csv_file)
+            counts[ticker] = len(added)
+            print("{} {}: imported {} rows{}".format(
+                table, ticker, len(added),
+                ", {} with unknown dates skipped".format(len(unparsed)) if len(unparsed) else ""
+            ))
+        return counts
+
+
+def _and(condition, other):
+    return other if condition is None else condition & other
+
+
+if __name__ == "__main__":
+    # python store.py [store path]  imports headlines/*.csv and analysts/*.csv
+    store = TextStore(sys.argv[1] if len(sys.argv) > 1 else STORE_PATH)
+    for table in TABLES:
+        store.import_directory(table, table)
@@ -0,0 +1,212 @@
+import json
+import math
+import os
+from collections import deque
+import pandas as pd
+from indicators import PERIOD, RSI_BOUNDS, ADX_LEVELS
+
+
+def _ewm_step(state, value, alpha):
+    # one step of pandas' ewm(adjust=True, ignore_na=False) so streamed values match the batch ones.
+    # state is [weighted mean, weight of everything seen so far]
+    weighted, old_weight = state
+    is_obs = not math.isnan(value)
+    if not math.isnan(weighted):
+        old_weight *= 1 - alpha
+        if is_obs:
+            if weighted != value:
+                weighted = (old_weight * weighted + value) / (old_weight + 1)
+            old_weight += 1
+    elif is_obs:
+        weighted = value
+    state[0], state[1] = weighted, old_weight
+    return weighted
+
+
+def _sign(value):
+    if math.isnan(value):
+        return float('nan')
+    return (value > 0) - (value < 0)
+
+
+class IndicatorState:
+    # online RSI/OBV/DMI/ADX that takes one bar at a time in O(1).
+    # seed it with from_history() and it carries on exactly where compute_indicators left off
+    def __init__(self, period=PERIOD, rsi_bounds=RSI_BOUNDS, adx_levels=ADX_LEVELS) -> None:
+        self.period = period
+        self.rsi_bounds = tuple(rsi_bounds)
+        self.adx_levels = tuple(adx_levels)
+
+        self.last_date = None
+        self.last_high = float('nan')
+        self.last_low = float('nan')
+        self.last_close = float('nan')
+        self.obv = float('nan')
+        self.true_range = deque(maxlen=period)
+        self.ewm = {name: [float('nan'), 1.0] for name in ['gain', 'loss', 'plus', 'minus', 'dx']}
+        self.bars = 0
+
+        # state before the latest bar so a bar for the same date (intraday refresh) can replace it
+        self.previous = None
+
+    @classmethod
+    def from_history(cls, price_history, **kwargs):
+        state = cls(**kwargs)
+        state.update_many(price_history)
+        return state
+
+    def update(self, date, high, low, close, volume):
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date < self.last_date:
+            raise ValueError("bar for {} is older than the last bar {}".format(date.date(), self.last_date.date()))
+
+        if self.last_date is not None and date == self.last_date:
+            # same day again, undo the old version of this bar first
+            self.load_dict(self.previous)
+        self.previous = self.to_dict()
+
+        alpha = 1.0 / self.period
+        high, low, close, volume = float(high), float(low), float(close), float(volume)
+        prev_close = self.last_close
+
+        # shared intermediates, the same ones compute_indicators uses
+        delta = close - prev_close
+        up_move = high - self.last_high
+        down_move = self.last_low - low
+        ranges = [abs(high - low), abs(high - prev_close), abs(prev_close - low)]
+        ranges = [r for r in ranges if not math.isnan(r)]
+        self.true_range.append(max(ranges) if ranges else float('nan'))
+        if len(self.true_range) == self.period:
+            atr = sum(self.true_range) / self.period
+        else:
+            atr = float('nan')
+
+        # RSI
+        gain = _ewm_step(self.ewm['gain'], delta if not delta < 0 else 0.0, alpha)
+        loss = _ewm_step(self.ewm['loss'], abs(delta if not delta > 0 else 0.0), alpha)
+        rsi = _divide_rsi(gain, loss)
+
+        # DMI / ADX
+        plus = up_move if (up_move > down_move and up_move > 0) else 0.0
+        minus = down_move if (down_move > up_move and down_move > 0) else 0.0
+        di_plus = 100 * _ewm_step(self.ewm['plus'], _divide(plus, atr), alpha)
+        di_minus = 100 * _ewm_step(self.ewm['minus'], _divide(minus, atr), alpha)
+        dx = _divide(abs(di_plus - di_minus), di_plus + di_minus)
+        adx = 100 * _ewm_step(self.ewm['dx'], dx, alpha)
+
+        # OBV only moves (and only has a bound) on days the close moved
+        obv_bounds = float('nan')
+        if delta > 0 or delta < 0:
+            signed_volume = volume if delta > 0 else -volume
+            if math.isnan(self.obv):
+                self.obv = signed_volume
+            else:
+                new_obv = self.obv + signed_volume
+                obv_bounds = _sign(new_obv - self.obv)
+                self.obv = new_obv
+
+        self.last_date = date
+        self.last_high, self.last_low, self.last_close = high, low, close
+        self.bars += 1
+
+        dmi_bounds = _sign(di_plus - di_minus)
+        return {
+            'Date': date,
+            'RSI': rsi,
+            'rsi_bounds': self.rsi_band(rsi),
+            'OBV': self.obv,
+            'obv_bounds': obv_bounds,
+            'DI+': di_plus,
+            'DI-': di_minus,
+            'dmi_bounds': dmi_bounds,
+            'ADX': adx,
+            'adx_bounds': self.adx_band(adx, dmi_bounds),
+        }
+
+    def update_many(self, bars):
+        # bars is a price history style frame (High, Low, Close, Volume) indexed by date
+        rows = [
+            self.update(date, high, low, close, volume)
+            for date, high, low, close, volume in zip(
+                bars.index, bars['High'], bars['Low'], bars['Close'], bars['Volume']
+            )
+        ]
+        return pd.DataFrame(rows).set_index('Date') if rows else pd.DataFrame()
+
+    def rsi_band(self, rsi):
+        if math.isnan(rsi):
+            return float('nan')
+        if rsi <= self.rsi_bounds[0]:
+            return -1
+        if rsi >= self.rsi_bounds[1]:
+            return 1
+        return 0
+
+    def adx_band(self, adx, dmi_bounds):
+        if math.isnan(adx) or math.isnan(dmi_bounds):
+            return float('nan')
+        return sum(adx > level for level in self.adx_levels) * dmi_bounds
+
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'rsi_bounds': list(self.rsi_bounds),
+            'adx_levels': list(self.adx_levels),
+            'last_date': None if self.last_date is None else self.last_date.isoformat(),
+            'last_high': self.last_high,
+            'last_low': self.last_low,
+            'last_close': self.last_close,
+            'obv': self.obv,
+            'true_range': list(self.true_range),
+            'ewm': {name: list(value) for name, value in self.ewm.items()},
+            'bars': self.bars,
+        }
+
+    def load_dict(self, state):
+        self.period = state['period']
+        self.rsi_bounds = tuple(state['rsi_bounds'])
+        self.adx_levels = tuple(state['adx_levels'])
+        self.last_date = None if state['last_date'] is None else pd.Timestamp(state['last_date'])
+        self.last_high = state['last_high']
+        self.last_low = state['last_low']
+        self.last_close = state['last_close']
+        self.obv = state['obv']
+        self.true_range = deque(state['true_range'], maxlen=self.period)
+        self.ewm = {name: list(value) for name, value in state['ewm'].items()}
+        self.bars = state['bars']
+        return self
+
+    def save(self, path):
+        # json keeps full float precision and NaN, written through a temp file so it's never half written
+        state = self.to_dict()
+        state['previous'] = self.previous
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        loaded = cls().load_dict(state)
+        loaded.previous = state.get('previous')
+        return loaded
+
+
+def _divide(numerator, denominator):
+    # numpy style division so 0/0 is nan and x/0 is inf instead of raising
+    if math.isnan(numerator) or math.isnan(denominator):
+        return float('nan')
+    if denominator == 0:
+        if numerator == 0:
+            return float('nan')
+        return math.copysign(float('inf'), numerator)
+    return numerator / denominator
+
+
+def _divide_rsi(gain, loss):
+    rs = _divide(gain, loss)
+    if math.isnan(rs):
+        return float('nan')
+    return 100 - (100 / (1 + rs))
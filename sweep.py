@@ -0,0 +1,303 @@
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from forward_returns import forward_return_frame, horizon_column
+from indicators import compute_indicators, RSI_BOUNDS, ADX_LEVELS
+from panel import HORIZONS
+
+
+# default grids. every combination is evaluated, the defaults come to a few thousand per ticker
+PERIOD_GRID = [7, 10, 14, 21, 28]
+RSI_LOW_GRID = list(range(10, 50, 2))
+RSI_HIGH_GRID = list(range(52, 92, 2))
+ADX_GRID = list(range(10, 85, 5))
+# OBV bounds are the sign of the change in OBV over this many of its rows (1 is what Stock uses)
+OBV_LOOKBACK_GRID = [1, 2, 3, 5, 10, 20]
+# headline/analyst days only count as positive/negative when the daily mean is past +/- this
+DEAD_ZONE_GRID = [0, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5]
+
+# processes the grid is spread over, None uses every core and 1 runs in this process
+SWEEP_WORKERS = None
+
+# below this many configurations times price bars starting the process pool costs more than it
+# saves. measured on 3000 bars: a configuration takes about 0.1ms, starting the pool and sending it
+# the inputs about 0.3s, so it only pays from about 8000 configurations on 3000 bars with a few
+# cores. the default grid (4297 configurations) goes parallel on histories over about 5600 bars,
+# shorter ones run in this process
+MIN_PARALLEL = 8000 * 3000
+
+# configurations with fewer signal days than this (over all their bounds) aren't ranked
+MIN_COUNT = 20
+
+# where python sweep.py writes each ticker's ranking
+SWEEP_PATH = "reports/sweep_{}.csv"
+
+RESULT_COLUMNS = ['Signal', 'Period', 'Params', 'Bound', 'Horizon', 'count', 'mean', 'std', 'hit_rate']
+
+# set by the pool initializer so the price history is only sent to each worker once
+_worker_inputs = None
+
+
+def _init_worker(inputs):
+    global _worker_inputs
+    _worker_inputs = inputs
+
+
+def _run_task(task):
+    return evaluate(task, **_worker_inputs)
+
+
+class SharedReturns:
+    # forward returns (percent) over every valid bar, worked out once per ticker and sliced for each signal
+    def __init__(self, price_history, horizons, market_time) -> None:
+        self.price_history = price_history
+        self.horizons = horizons
+        self.market_time = market_time
+        self.columns = [horizon_column(days, True) for days in horizons]
+        frame = forward_return_frame(
+            pd.Series(0, index=price_history.index), price_history, horizons, market_time, keep_prices=False
+        )
+        # forward_return_frame drops the last bars, keep every valid one so tails line up
+        valid = price_history[['High', 'Low', 'Close']].notna().all(axis=1).to_numpy()
+        self.index = price_history.index[valid]
+        self.values = np.full((len(self.index), len(horizons)), np.nan)
+        self.values[:len(frame)] = frame[self.columns].to_numpy()
+
+    def rows(self, signal):
+        # (signal on the rows used, their returns) for the rows plotting_shift would use: the days
+        # with a signal and a price, shifting over those rows only. when those rows are the last n
+        # bars (everything but a warm up) the shared returns are sliced, otherwise worked out again
+        signal = signal.reindex(self.price_history.index).dropna()
+        signal = signal[signal.index.isin(self.index)]
+        start = len(self.index) - len(signal)
+        if start < 0 or not self.index[start:].equals(signal.index):
+            frame = forward_return_frame(signal, self.price_history, self.horizons, self.market_time, keep_prices=False)
+            return frame['Bound'], frame[self.columns].to_numpy()
+        returns = self.values[start:]
+        complete = ~np.isnan(returns).any(axis=1)
+        return signal[complete], returns[complete]
+
+
+class _Sorted:
+    # the returns sorted by signal value with running sums, so the stats of the rows between any
+    # two values are two lookups. every threshold of a grid is then a searchsorted away
+    def __init__(self, values, returns) -> None:
+        order = np.argsort(values, kind='stable')
+        self.values = values[order]
+        returns = returns[order]
+        zero = np.zeros((1, returns.shape[1]))
+        self.sums = np.vstack([zero, np.cumsum(returns, axis=0)])
+        self.squares = np.vstack([zero, np.cumsum(returns**2, axis=0)])
+        self.ups = np.vstack([zero, np.cumsum(returns > 0, axis=0)])
+        self.downs = np.vstack([zero, np.cumsum(returns < 0, axis=0)])
+
+    def position(self, values, side):
+        return np.searchsorted(self.values, values, side=side)
+
+    def stats(self, start, stop, direction):
+        # stats of sorted rows [start, stop) for each pair, one row per pair and a column per horizon.
+        # a hit is a return in the signal's direction
+        count = (stop - start).astype(float)[:, None]
+        total = self.sums[stop] - self.sums[start]
+        squares = self.squares[stop] - self.squares[start]
+        hits = (self.ups if direction > 0 else self.downs)
+        hits = hits[stop] - hits[start]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / count
+            std = np.sqrt(np.maximum(squares - total * mean, 0) / (count - 1))
+            hit_rate = hits / count
+        return np.broadcast_to(count, mean.shape), mean, std, hit_rate
+
+
+def _frame(signal, period, params, bound, horizons, count, mean, std, hit_rate):
+    # configs x horizons arrays to long rows
+    configs, width = count.shape
+    return pd.DataFrame({
+        'Signal': signal,
+        'Period': period,
+        'Params': np.repeat(params, width),
+        'Bound': np.repeat(bound, width) if np.ndim(bound) else bound,
+        'Horizon': np.tile(horizons, configs),
+        'count': count.ravel().astype(int),
+        'mean': mean.ravel(),
+        'std': std.ravel(),
+        'hit_rate': hit_rate.ravel(),
+    }, columns=RESULT_COLUMNS)
+
+
+def sweep_bands(name, period, values, returns, lows, highs, horizons, strict=False, labels=None):
+    # a low/high band on one value: -1 at or below low, 1 at or above high (strictly past them
+    # with strict). one call covers every (low, high) pair, highs under their low are skipped
+    lows, highs = np.asarray(lows, dtype=float), np.asarray(highs, dtype=float)
+    keep = highs > lows if not strict else highs >= lows
+    lows, highs = lows[keep], highs[keep]
+    ordered = _Sorted(np.asarray(values, dtype=float), returns)
+    n = len(ordered.values)
+
+    low_stop = ordered.position(lows, 'left' if strict else 'right')
+    high_start = ordered.position(highs, 'right' if strict else 'left')
+    if labels is None:
+        params = ["{:g}/{:g}".format(low, high) for low, high in zip(lows, highs)]
+    else:
+        params = list(np.asarray(labels)[keep])
+    return pd.concat([
+        _frame(name, period, params, -1, horizons, *ordered.stats(np.zeros_like(low_stop), low_stop, -1)),
+        _frame(name, period, params, 1, horizons, *ordered.stats(high_start, np.full_like(high_start, n), 1)),
+    ], ignore_index=True)
+
+
+def sweep_adx(period, adx_values, direction, returns, levels, horizons):
+    # ADX bound = level (how many of the thresholds it is over) times the DMI direction,
+    # for every threshold triple at once. level 0 is never reported, like in Stock
+    levels = np.sort(np.asarray(levels, dtype=float), axis=1)
+    params = ["/".join("{:g}".format(t) for t in triple) for triple in levels]
+    edges = np.hstack([levels, np.full((len(levels), 1), np.inf)])
+
+    frames = []
+    for sign in (-1, 1):
+        rows = direction == sign
+        ordered = _Sorted(adx_values[rows], returns[rows])
+        # rows over edge k, the ones at level k are over edge k but not edge k+1
+        over = [ordered.position(edges[:, k], 'right') for k in range(edges.shape[1])]
+        for level in range(1, edges.shape[1]):
+            stats = ordered.stats(over[level-1], over[level], sign)
+            frames.append(_frame('ADX', period, params, sign * level, horizons, *stats))
+    return pd.concat(frames, ignore_index=True)
+
+
+def evaluate(task, returns, headlines=None, analysts=None):
+    # one (signal, period) slice of the grid: the indicator is computed once and every threshold
+    # of the slice comes out of the same sorted returns
+    kind, period, grid = task
+    price_history, horizons = returns.price_history, returns.horizons
+    if kind == 'RSI':
+        rsi = compute_indicators(price_history, period=period)['rsi']
+        values, rows = returns.rows(rsi.iloc[:, 0])
+        lows, highs = zip(*grid)
+        return sweep_bands('RSI', period, values, rows, lows, highs, horizons)
+    if kind == 'ADX':
+        adx = compute_indicators(price_history, period=period)['adx']
+        values, rows = returns.rows(adx['{} period ADX.'.format(period)])
+        direction = adx['dmi_bounds'].reindex(values.index).to_numpy()
+        return sweep_adx(period, values.to_numpy(dtype=float), direction, rows, grid, horizons)
+    if kind == 'OBV':
+        # OBV only has rows on days the close moved, period is how many of them the change is over
+        change = compute_indicators(price_history)['obv']['diff'].rolling(period).sum()
+        values, rows = returns.rows(change)
+        return sweep_bands('OBV', period, values, rows, [0], [0], horizons, strict=True)
+
+    # headlines/analysts come already aligned to the bars (TradingCalendar.align). bars with
+    # nothing known count as 0 so they stay in the rows but never in a band, like -999 in Stock
+    aligned = (headlines if kind == 'Headlines' else analysts).fillna(0)
+    values, rows = returns.rows(aligned)
+    zones = np.asarray(grid, dtype=float)
+    return sweep_bands(kind, 0, values, rows, -zones, zones, horizons, strict=True,
+                       labels=["{:g}".format(zone) for zone in zones])
+
+
+def build_tasks(periods=PERIOD_GRID, rsi_lows=RSI_LOW_GRID, rsi_highs=RSI_HIGH_GRID, adx_grid=ADX_GRID,
+                obv_lookbacks=OBV_LOOKBACK_GRID, dead_zones=DEAD_ZONE_GRID, headlines=False, analysts=False):
+    # (signal, period, thresholds) for every slice of the grid
+    rsi_pairs = [(low, high) for low in rsi_lows for high in rsi_highs if high > low]
+    adx_triples = list(itertools.combinations(sorted(adx_grid), 3))
+    tasks = [('RSI', period, rsi_pairs) for period in periods]
+    tasks += [('ADX', period, adx_triples) for period in periods]
+    tasks += [('OBV', lookback, None) for lookback in obv_lookbacks]
+    if headlines:
+        tasks.append(('Headlines', 0, list(dead_zones)))
+    if analysts:
+        tasks.append(('Analysts', 0, list(dead_zones)))
+    return tasks
+
+
+def sweep(price_history, headlines=None, analysts=None, tasks=None, horizons=HORIZONS, market_time='Close',
+          workers=SWEEP_WORKERS):
+    # stats for every configuration, bound and horizon (percent forward returns).
+    # headlines/analysts are sentiment scores / encoded recommendations aligned to the price bars
+    tasks = tasks if tasks is not None else build_tasks(
+        headlines=headlines is not None, analysts=analysts is not None
+    )
+    inputs = {
+        'returns': SharedReturns(price_history, horizons, market_time),
+        'headlines': headlines, 'analysts': analysts,
+    }
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    configurations = sum(len(grid) if grid is not None else 1 for _, _, grid in tasks)
+    if workers <= 1 or len(tasks) <= 1 or configurations * len(price_history) < MIN_PARALLEL:
+        frames = [evaluate(task, **inputs) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker,
+                                 initargs=(inputs,)) as pool:
+            frames = list(pool.map(_run_task, tasks))
+    return pd.concat(frames, ignore_index=True)
+
+
+def rank(results, min_count=MIN_COUNT, by='hit_rate'):
+    # one row per configuration and horizon with its bounds pooled, best first within each
+    # signal and horizon. signed_mean is the mean return in the direction each bound called
+    results = results.assign(
+        hits=results['hit_rate'].fillna(0) * results['count'],
+        signed=results['mean'].fillna(0) * results['count'] * np.sign(results['Bound']),
+    )
+    pooled = results.groupby(['Signal', 'Period', 'Params', 'Horizon'], sort=False)[['count', 'hits', 'signed']].sum()
+    pooled = pooled[pooled['count'] >= min_count]
+    pooled = pooled.assign(
+        hit_rate=pooled['hits'] / pooled['count'], signed_mean=pooled['signed'] / pooled['count']
+    ).drop(columns=['hits', 'signed']).reset_index()
+
+    pooled = pooled.sort_values(['Signal', 'Horizon', by], ascending=[True, True, False], kind='stable')
+    pooled['Rank'] = pooled.groupby(['Signal', 'Horizon']).cumcount() + 1
+    return pooled.reset_index(drop=True)
+
+
+def default_params(signal):
+    # the Params Stock uses, to find it in the ranking
+    return {
+        'RSI': "{:g}/{:g}".format(*RSI_BOUNDS),
+        'ADX': "/".join("{:g}".format(t) for t in ADX_LEVELS),
+        'OBV': "0/0",
+        'Headlines': "0",
+        'Analysts': "0",
+    }[signal]
+
+
+if __name__ == "__main__":
+    # python sweep.py [tickers]  ranks every configuration for each ticker from the local stores
+    import time
+    from base import TICKER_LIST, mypath
+    from prices import PriceStore
+    from store import TextStore
+    from sentiment import SentimentEngine, SentimentCache
+    from recommendations import load_rules, encode_recommendations
+    from align import TradingCalendar
+    from dedup import representatives
+
+    price_store = PriceStore(mypath+'/prices')
+    text_store = TextStore(mypath+'/store')
+    engine = SentimentEngine(cache=SentimentCache(mypath+'/cache/sentiment'))
+    rules = load_rules()
+
+    for ticker in sys.argv[1:] or TICKER_LIST:
+        start = time.time()
+        price_history = price_store.history(ticker, refresh=False)
+        calendar = TradingCalendar(price_history.index)
+        headlines = text_store.load('headlines', ticker)
+        if headlines is not None:
+            # one headline per cluster of near duplicates, like Stock
+            headlines = representatives(headlines)
+            headlines = calendar.align(headlines['Date'], engine.score(headlines['Headline']))
+        analysts = text_store.load('analysts', ticker)
+        if analysts is not None:
+            analysts = calendar.align(analysts['Date'], encode_recommendations(analysts['Recommendation'], rules)[0])
+
+        results = sweep(price_history, headlines, analysts)
+        ranked = rank(results)
+        ranked.to_csv(SWEEP_PATH.format(ticker), index=False)
+        configs = len(results.drop_duplicates(['Signal', 'Period', 'Params']))
+        print("{}: {} configurations in {:.1f}s, wrote {}".format(
+            ticker, configs, time.time() - start, SWEEP_PATH.format(ticker)
+        ))
+        print(ranked[ranked['Rank'] == 1].round(3).to_string(index=False))
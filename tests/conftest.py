@@ -0,0 +1,29 @@
+import os
+import sys
+import pytest
+
+# the modules live flat at the top of the repo
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Stock makes figs/<ticker> under base.mypath, keep that (and the store) out of the repo
+    import base
+    (tmp_path / 'figs').mkdir()
+    monkeypatch.setattr(base, 'mypath', str(tmp_path))
+    return tmp_path
+
+
+def make_stock(ticker, workdir, **kwargs):
+    # a lazy Stock that only does what a test asks of it
+    import base
+    from store import TextStore
+    kwargs.setdefault('text_store', TextStore(str(workdir / 'store')))
+    return base.Stock(
+        ticker, lazy=True, sentiment_workers=1, sentiment_cache=None, artifact_cache=None, stats_only=True, **kwargs
+    )
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from align import TradingCalendar, band
+
+
+BARS = pd.bdate_range('2024-01-01', '2024-01-31')
+
+
+def snapped(calendar, *timestamps):
+    positions = calendar.snap(pd.to_datetime(list(timestamps)))
+    return [calendar.bars[p] if p < len(calendar.bars) else None for p in positions]
+
+
+def test_snap_to_the_first_bar_that_can_trade():
+    calendar = TradingCalendar(BARS)
+    friday, monday = pd.Timestamp('2024-01-05'), pd.Timestamp('2024-01-08')
+    assert snapped(calendar, '2024-01-05', '2024-01-05 10:00', '2024-01-05 15:59') == [friday] * 3
+    # at or after the close only the next session can act on it, weekends go to monday too
+    assert snapped(calendar, '2024-01-05 16:00', '2024-01-05 17:00', '2024-01-06 12:00') == [monday] * 3
+    assert snapped(calendar, '2024-02-03') == [None]
+
+
+def test_snap_at_the_open():
+    calendar = TradingCalendar(BARS, market_time='Open')
+    assert snapped(calendar, '2024-01-05 09:29', '2024-01-05 09:30') == [
+        pd.Timestamp('2024-01-05'), pd.Timestamp('2024-01-08')
+    ]
+
+
+def test_align_means_and_staleness():
+    calendar = TradingCalendar(BARS)
+    timestamps = pd.to_datetime(['2024-01-02', '2024-01-02 11:00', '2024-01-04'])
+    aligned = calendar.align(timestamps, [1.0, -3.0, 0.5], max_staleness=2)
+
+    assert np.isnan(aligned.iloc[0])
+    assert aligned.loc['2024-01-02'] == -1.0
+    assert aligned.loc['2024-01-03'] == -1.0
+    assert aligned.loc['2024-01-08'] == 0.5
+    assert np.isnan(aligned.loc['2024-01-09'])
+    assert list(band(aligned).iloc[:4]) == [-999, -1, -1, 1]
@@ -0,0 +1,201 @@
+import os
+import xml.etree.ElementTree as ET
+import pandas as pd
+import pytest
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.webdriver.common.by import By
+import base
+import browser
+from browser import BrowserPool, ScrapeError
+from conftest import FIXTURES, make_stock
+
+
+PAGES = os.path.join(FIXTURES, 'pages')
+
+# the page every url opens on
+START_PAGES = {
+    'nasdaq.com': 'nasdaq_news_tab1.html',
+    'finance.yahoo.com': 'yahoo_analysis_consent.html',
+}
+
+
+class FixtureElement:
+    def __init__(self, node) -> None:
+        self.node = node
+
+    @property
+    def text(self):
+        # rendered text, one line per block of text like selenium gives it
+        return '\n'.join(part.strip() for part in self.node.itertext() if part.strip())
+
+    def find_elements(self, by, value):
+        assert by == By.TAG_NAME
+        return [FixtureElement(node) for node in self.node.iter(value) if node is not self.node]
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return 'disabled' not in self.node.attrib
+
+
+class FixtureDriver:
+    # stands in for chrome on the saved pages. the xpaths are looked up with ElementTree, a click
+    # shows the element's data-fixture-next page. every page takes `lag` lookups to render and
+    # the first `failing_loads` page loads fail, so the waits and retries have something to do
+    def __init__(self, lag=2, failing_loads=0) -> None:
+        self.lag = lag
+        self.failing_loads = failing_loads
+        self.root = None
+        self.next_root = None
+        self.pending = 0
+        self.loads = []
+        self.clicks = 0
+        self.quit_called = False
+
+    def _load(self, name):
+        return ET.parse(os.path.join(PAGES, name)).getroot()
+
+    def get(self, url):
+        self.loads.append(url)
+        if len(self.loads) <= self.failing_loads:
+            raise WebDriverException('net::ERR_CONNECTION_RESET')
+        name = next(page for site, page in START_PAGES.items() if site in url)
+        self.root, self.next_root, self.pending = None, self._load(name), self.lag
+
+    def _render(self):
+        # the page swaps in once it has been polled lag times
+        if self.next_root is not None:
+            if self.pending:
+                self.pending -= 1
+                return
+            self.root, self.next_root = self.next_root, None
+
+    def find_elements(self, by, value):
+        assert by == By.XPATH
+        self._render()
+        if self.root is None:
+            return []
+        path = '.' + value if value.startswith('//') else value[len('/html/'):]
+        return [FixtureElement(node) for node in self.root.findall(path)]
+
+    def find_element(self, by, value):
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(value)
+        return found[0]
+
+    def execute_script(self, script, *args):
+        if 'click()' in script:
+            self.clicks += 1
+            next_page = args[0].node.get('data-fixture-next')
+            if next_page:
+                # the old page stays up until the new one renders
+                self.next_root, self.pending = self._load(next_page), self.lag
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture(autouse=True)
+def fast_waits(monkeypatch):
+    monkeypatch.setattr(browser, 'POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(browser, 'WAIT_TIMEOUT', 2)
+    monkeypatch.setattr(browser, 'BACKOFF', 0.01)
+    monkeypatch.setattr(base, 'POPUP_TIMEOUT', 0.5)
+
+
+def counting_pool(failing_loads=0):
+    # only the first browser has failing page loads
+    drivers = []
+
+    def factory():
+        drivers.append(FixtureDriver(failing_loads=0 if drivers else failing_loads))
+        return drivers[-1]
+    return BrowserPool(size=1, factory=factory), drivers
+
+
+def test_scrape_news_reads_every_tab(workdir):
+    pool, drivers = counting_pool()
+    headlines = make_stock('aapl', workdir, browser_pool=pool).scrape_news(save=False)
+
+    assert len(headlines) == 7
+    assert headlines.Headline.iloc[0] == 'Apple shares rise after iPhone demand holds up'
+    assert headlines.Date.iloc[0] == pd.Timestamp('2022-11-03')
+    assert headlines.Date.iloc[-1] == pd.Timestamp('2022-10-28')
+    # two clicks on the next tab arrow, none past the last tab
+    assert drivers[0].clicks == 2
+
+
+def test_scrape_news_stops_at_stored_headlines(workdir):
+    pool, drivers = counting_pool()
+    stop_at = {(pd.Timestamp('2022-11-02'), 'Apple cuts iPad production as demand slows')}
+    headlines = make_stock('aapl', workdir, browser_pool=pool).scrape_news(save=False, stop_at=stop_at)
+
+    assert list(headlines.Headline) == [
+        'Apple shares rise after iPhone demand holds up',
+        'Why Apple Stock Jumped Today',
+        'Apple supplier warns on chip shortages',
+        'Wall Street rallies as tech stocks rebound',
+    ]
+    assert drivers[0].clicks == 1
+
+
+def test_scrape_analyst_through_the_consent_popup(workdir):
+    pool, drivers = counting_pool()
+    analyst = make_stock('aapl', workdir, browser_pool=pool).scrape_analyst()
+
+    assert list(analyst.columns) == ['Change', 'Analyst', 'Recommendation', 'Date']
+    assert list(analyst.Change) == ['Maintains', 'Downgrade', 'Upgrade']
+    assert analyst.Analyst.iloc[1] == 'Barclays'
+    assert analyst.Recommendation.iloc[2] == 'Neutral to Buy'
+    # the popup and the show more button
+    assert drivers[0].clicks == 2
+
+
+def test_page_loads_are_retried(workdir):
+    pool, drivers = counting_pool(failing_loads=browser.RETRIES - 1)
+    headlines = make_stock('aapl', workdir, browser_pool=pool).scrape_news(save=False)
+
+    assert len(headlines) == 7
+    assert len(drivers[0].loads) == browser.RETRIES
+
+
+def test_failed_scrape_discards_the_browser(workdir):
+    pool, drivers = counting_pool(failing_loads=browser.RETRIES)
+    with pytest.raises(ScrapeError, match='failed after {} attempts'.format(browser.RETRIES)):
+        make_stock('aapl', workdir, browser_pool=pool).scrape_news(save=False)
+
+    assert drivers[0].quit_called
+    assert pool.created == 0
+
+    # the next scrape gets a fresh browser
+    make_stock('msft', workdir, browser_pool=pool).scrape_analyst()
+    assert len(drivers) == 2
+
+
+def test_pool_reuses_the_browser_between_tickers(workdir):
+    pool, drivers = counting_pool()
+    for ticker in ('aapl', 'msft'):
+        stock = make_stock(ticker, workdir, browser_pool=pool)
+        stock.scrape_news(save=False)
+        stock.scrape_analyst()
+
+    assert len(drivers) == 1
+    assert [url.split('/')[2] for url in drivers[0].loads] == [
+        'www.nasdaq.com', 'finance.yahoo.com', 'www.nasdaq.com', 'finance.yahoo.com'
+    ]
+    pool.close()
+    assert drivers[0].quit_called
+
+
+def test_wait_for_text_waits_for_new_contents():
+    driver = FixtureDriver(lag=3)
+    driver.get('https://www.nasdaq.com/market-activity/stocks/aapl/news-headlines')
+    first = browser.wait_for_text(driver, base.NEWS_LIST)
+    browser.click(driver, driver.find_element(By.XPATH, base.NEWS_NEXT_TAB))
+
+    # the first tab is still up right after the click
+    assert driver.find_element(By.XPATH, base.NEWS_LIST).text == first
+    second = browser.wait_for_text(driver, base.NEWS_LIST, previous=first)
+    assert second.startswith('NOV 2, 2022\nApple cuts iPad production')
@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+from dedup import cluster_headlines, collapse_headlines, representatives
+
+
+# real pairs from headlines/aapl.csv
+COPIES = [
+    ("EXCLUSIVE-Foxconn COVID woes may hit up to 30% of iPhone Nov shipments from Zhengzhou plant - source",
+     "Foxconn COVID woes may hit up to 30% of iPhone Nov shipments from Zhengzhou plant - source"),
+    ("Wall St rises on Microsoft, Alphabet earnings as Fed decision looms",
+     "US STOCKS-Wall St rises on Microsoft, Alphabet earnings as Fed decision looms"),
+    ("Technology Sector Update for 07/25/2022: META,AAPL,SSYS,NNDM,GILT",
+     "Technology Sector Update for 07/25/2022: AAPL,SSYS,NNDM,GILT"),
+    ("Why Apple Stock Jumped Today", "WHY APPLE STOCK JUMPED TODAY!"),
+]
+
+# similar wording, different news (and often the opposite sentiment)
+DIFFERENT = [
+    ("Why Apple Stock Slumped Today", "Why Apple Stock Jumped Today"),
+    ("GLOBAL MARKETS-Wall Street bounces off lows as UK steps in to calm bonds",
+     "GLOBAL MARKETS-Wall Street fear lingers as UK steps in to calm bonds"),
+    ("GLOBAL MARKETS-World stocks eye best month since late 2020, dollar slips",
+     "GLOBAL MARKETS-World stocks eye best month since late 2020, dollar recovers"),
+    ("US STOCKS-Wall Street falls as Walmart warning rattles retail sector",
+     "US STOCKS-Wall Street falls as Walmart warning rattles retail stocks"),
+    ("Stock Market News for Jun 8, 2022", "Stock Market News for Jun 9, 2022"),
+    ("7 Dow Stocks to Buy on the Dip or You'll Be Kicking Yourself Later",
+     "3 Tech Stocks to Buy on the Dip or You'll Be Kicking Yourself Later"),
+]
+
+
+def clusters(*headlines, dates=None):
+    dates = dates or ['2022-07-27'] * len(headlines)
+    return list(cluster_headlines(pd.to_datetime(dates), list(headlines)))
+
+
+@pytest.mark.parametrize('first, second', COPIES)
+def test_syndicated_copies_collapse(first, second):
+    assert clusters(first, second) == [0, 0]
+
+
+@pytest.mark.parametrize('first, second', DIFFERENT)
+def test_reworded_news_stays_apart(first, second):
+    assert clusters(first, second) == [0, 1]
+
+
+def test_copy_of_a_copy_with_a_changed_word_stays_apart():
+    # the middle one is a copy of both, the outer two aren't copies of each other
+    assert clusters(
+        "US STOCKS-Wall Street falls as Walmart warning rattles retail sector",
+        "Wall Street falls as Walmart warning rattles retail",
+        "Wall Street falls as Walmart warning rattles retail stocks",
+    ) == [0, 0, 2]
+
+
+def test_only_copies_within_the_window():
+    headline = "Apple store workers in Atlanta file for first union election"
+    dates = ['2022-04-20', '2022-04-21', '2022-04-25']
+    assert clusters(headline, headline, headline, dates=dates) == [0, 0, 2]
+
+
+def test_cluster_is_labelled_by_its_earliest_headline():
+    assert clusters(
+        "US STOCKS-Wall St rises on Microsoft, Alphabet earnings as Fed decision looms",
+        "Wall St rises on Microsoft, Alphabet earnings as Fed decision looms",
+        dates=['2022-07-27 12:00', '2022-07-27 09:00'],
+    ) == [1, 1]
+
+
+def test_collapse_and_representatives():
+    headlines = pd.DataFrame({
+        'Ticker': ['aapl'] * 3 + ['msft'],
+        'Date': pd.to_datetime(['2022-07-27'] * 4),
+        'Headline': [COPIES[1][0], COPIES[1][1], DIFFERENT[0][0], COPIES[1][0]],
+    })
+    collapsed = collapse_headlines(headlines)
+    assert list(collapsed.Cluster) == [0, 0, 2, 0]
+    assert list(collapsed.Weight) == [3, 3, 1, 3]
+    assert list(collapsed.Representative) == [True, False, True, False]
+
+    # every ticker's copies are only clustered with its own
+    kept = representatives(headlines, by='Ticker')
+    assert list(kept.Ticker) == ['aapl', 'aapl', 'msft']
+    assert list(kept.Weight) == [2, 1, 1]
+
+    assert len(collapse_headlines(headlines.iloc[:0])) == 0
@@ -0,0 +1,237 @@
+import asyncio
+import collections
+import json
+import os
+import threading
+import pandas as pd
+import pytest
+from aiohttp import web
+import batch
+from http_backend import HttpScraper, RateLimiter
+from browser import ScrapeError
+from store import TextStore
+from conftest import FIXTURES
+
+
+RECORDED = os.path.join(FIXTURES, 'http')
+
+CRUMB = 'dK3x9Qv2mLp'
+
+
+def recorded(name):
+    with open(os.path.join(RECORDED, name)) as f:
+        return json.load(f)
+
+
+class RecordedServer:
+    # serves the recorded nasdaq/yahoo responses on localhost from its own thread (the scraper
+    # runs its own event loop). statuses[ticker] is a list of error statuses to answer with
+    # before the recorded response, 'gone' tickers always get a 404
+    def __init__(self) -> None:
+        self.hits = collections.Counter()
+        self.statuses = {}
+        self.news = recorded('nasdaq_news_aapl.json')
+        self.upgrades = recorded('yahoo_upgrades_aapl.json')
+
+        app = web.Application()
+        app.router.add_get('/news', self.handle_news)
+        app.router.add_get('/quote/{ticker}', self.handle_analysts)
+        app.router.add_get('/cookie', self.handle_cookie)
+        app.router.add_get('/crumb', self.handle_crumb)
+        self.runner = web.AppRunner(app)
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self._call(self._start())
+        self.url = 'http://localhost:{}'.format(self.runner.addresses[0][1])
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def _start(self):
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', 0).start()
+
+    def close(self):
+        self._call(self.runner.cleanup())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def scraper(self, **kwargs):
+        kwargs.setdefault('backoff', 0.01)
+        kwargs.setdefault('rate_limit', None)
+        return HttpScraper(
+            news_url=self.url + '/news', analyst_url=self.url + '/quote/{}',
+            crumb_url=self.url + '/crumb', crumb_cookie_url=self.url + '/cookie', **kwargs
+        )
+
+    def _error(self, ticker):
+        self.hits[ticker] += 1
+        if ticker == 'gone':
+            return web.json_response(recorded('yahoo_not_found.json'), status=404)
+        if self.statuses.get(ticker):
+            return web.Response(status=self.statuses[ticker].pop(0))
+        return None
+
+    async def handle_news(self, request):
+        ticker = request.query['q'].split('|')[0]
+        error = self._error(ticker)
+        if error is not None:
+            return error
+        offset, limit = int(request.query['offset']), int(request.query['limit'])
+        payload = json.loads(json.dumps(self.news))
+        payload['data']['rows'] = payload['data']['rows'][offset:offset+limit]
+        return web.json_response(payload)
+
+    async def handle_analysts(self, request):
+        ticker = request.match_info['ticker']
+        if request.query.get('crumb') != CRUMB or 'B' not in request.cookies:
+            return web.Response(status=401)
+        error = self._error(ticker)
+        if error is not None:
+            return error
+        return web.json_response(self.upgrades)
+
+    async def handle_cookie(self, request):
+        self.hits['cookie'] += 1
+        response = web.Response(status=404, text='<html>not found</html>')
+        response.set_cookie('B', 'abc')
+        return response
+
+    async def handle_crumb(self, request):
+        self.hits['crumb'] += 1
+        return web.Response(text=CRUMB)
+
+
+@pytest.fixture
+def server():
+    server = RecordedServer()
+    yield server
+    server.close()
+
+
+def test_news_parses_every_page(server):
+    headlines = server.scraper(page_size=2).news('aapl')
+
+    assert list(headlines.columns) == ['Date', 'Headline']
+    assert len(headlines) == 7
+    assert headlines.Date.iloc[0] == '11/3/2022'
+    assert headlines.Date.iloc[-1] == '10/28/2022'
+    # titles are stripped
+    assert headlines.Headline.iloc[2] == 'Apple supplier warns on chip shortages'
+    assert server.hits['aapl'] == 4
+
+
+def test_news_stops_at_stored_headlines(server):
+    stop_at = {(pd.Timestamp('2022-11-02'), 'Apple cuts iPad production as demand slows')}
+    headlines = server.scraper(page_size=2, concurrency=1).news('aapl', stop_at=stop_at)
+
+    assert list(headlines.Headline) == [
+        'Why Apple Stock Jumped Today',
+        'Apple shares rise after iPhone demand holds up',
+        'Apple supplier warns on chip shortages',
+    ]
+    assert server.hits['aapl'] == 2
+
+
+def test_analysts_parse_with_one_crumb(server):
+    frames, failures = server.scraper().analysts(['aapl', 'msft', 'goog'])
+
+    assert not failures
+    analysts = frames['msft']
+    assert list(analysts.columns) == ['Change', 'Analyst', 'Recommendation', 'Date']
+    assert list(analysts.Change) == ['Maintains', 'Downgrade', 'Upgrade', 'Initiated']
+    assert list(analysts.Recommendation) == [
+        'Overweight to Overweight', 'Overweight to Equal-Weight', 'Neutral to Buy', 'to Buy'
+    ]
+    assert analysts.Date.iloc[0] == '10/28/2022'
+    assert server.hits['crumb'] == 1
+    assert server.hits['cookie'] == 1
+
+
+@pytest.mark.parametrize('statuses', [[429], [503, 500]])
+def test_rate_limits_and_server_errors_are_retried(server, statuses):
+    server.statuses['aapl'] = list(statuses)
+    headlines = server.scraper().news('aapl')
+
+    assert len(headlines) == 7
+    assert server.hits['aapl'] == len(statuses) + 1
+
+
+def test_retries_run_out(server):
+    server.statuses['aapl'] = [503] * 3
+    with pytest.raises(ScrapeError, match='failed after 3 attempts'):
+        server.scraper(retries=3).news('aapl')
+    assert server.hits['aapl'] == 3
+
+
+def test_not_found_is_not_retried(server):
+    with pytest.raises(ScrapeError, match='404'):
+        server.scraper().analysts('gone')
+    assert server.hits['gone'] == 1
+
+
+def test_one_failing_ticker_keeps_the_rest(server):
+    server.statuses['msft'] = [503] * 3
+    frames, failures = server.scraper(retries=3).news(['aapl', 'msft', 'gone', 'goog'])
+
+    assert sorted(frames) == ['aapl', 'goog']
+    assert len(frames['goog']) == 7
+    assert sorted(failures) == ['gone', 'msft']
+    assert all(isinstance(e, ScrapeError) for e in failures.values())
+
+
+def test_prefetch_stores_what_worked_and_reports_the_rest(server, tmp_path, monkeypatch):
+    # the repo's own headlines/<ticker>.csv files would be imported instead of fetched
+    monkeypatch.chdir(tmp_path)
+    text_store = TextStore(str(tmp_path / 'store'))
+    failed = batch.prefetch_http(['aapl', 'gone'], server.scraper(), text_store)
+
+    assert list(failed) == ['gone']
+    assert 'fetching headlines: ScrapeError' in failed['gone']
+    assert 'fetching analysts: ScrapeError' in failed['gone']
+    assert len(text_store.load('headlines', 'aapl')) == 7
+    assert len(text_store.load('analysts', 'aapl')) == 4
+    assert text_store.load('headlines', 'gone') is None
+
+    summary = batch.run_batch(['gone'], summary_path=str(tmp_path / 'summary.csv'), failed=failed)
+    assert list(summary.Status) == ['failed']
+    assert summary.Error.iloc[0] == failed['gone']
+    assert os.path.isfile(tmp_path / 'summary.csv')
+
+
+def test_scraping_inside_a_running_event_loop(server):
+    # like a jupyter or vs code cell
+    async def cell():
+        return server.scraper().news('aapl')
+
+    assert len(asyncio.run(cell())) == 7
+
+
+def test_rate_limiter_spaces_requests():
+    async def starts():
+        limiter = RateLimiter(50)
+        loop = asyncio.get_running_loop()
+
+        async def request():
+            await limiter.wait()
+            return loop.time()
+        return sorted(await asyncio.gather(*[request() for _ in range(5)]))
+
+    # sleeps never wake early, so five requests take at least four slots
+    times = asyncio.run(starts())
+    assert times[-1] - times[0] >= 4 / 50 * 0.99
+    assert times[2] - times[0] >= 2 / 50 * 0.99
+
+
+def test_rate_limiter_off():
+    async def waits():
+        limiter = RateLimiter(None)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(100):
+            await limiter.wait()
+        return loop.time() - start
+
+    assert asyncio.run(waits()) < 0.1
@@ -0,0 +1,46 @@
+import pytest
+import panel
+from bench import synthetic_prices
+from forward_returns import forward_return_frame, forward_return_stats
+from indicators import compute_indicators
+from prices import PriceStore
+
+
+TICKERS = ['flat', 'steady']
+
+
+@pytest.fixture
+def price_store(tmp_path):
+    # 'flat' has a close that doesn't move every 7th bar, so OBV has gaps
+    store = PriceStore(str(tmp_path / 'prices'))
+    for seed, ticker in enumerate(TICKERS):
+        history = synthetic_prices(800, seed=seed)
+        if ticker == 'flat':
+            history.loc[history.index[::7], 'Close'] = history['Close'].shift(1)[::7]
+        store.save(ticker, history)
+    return store
+
+
+def test_panel_stats_match_stock(price_store):
+    stats = panel.panel_stats(panel.build_panel(TICKERS, price_store))
+
+    for ticker in TICKERS:
+        history = price_store.load(ticker)
+        indicators = compute_indicators(history)
+        for signal, key in (('RSI', 'rsi'), ('OBV', 'obv'), ('ADX', 'adx')):
+            # what Stock.plotting_shift works out
+            frame = forward_return_frame(indicators[key]['bounds'], history, panel.HORIZONS)
+            expected = forward_return_stats(frame, panel.HORIZONS, panel.SIGNAL_BOUNDS[signal])
+
+            got = stats[(stats.Signal == signal) & (stats.Ticker == ticker)]
+            both = expected.merge(got, on=['Bound', 'Horizon', 'Measure'], suffixes=('', '_panel'))
+            assert len(both) == len(expected)
+            assert (both['count'] == both['count_panel']).all(), (ticker, signal)
+            assert both['mean'].sub(both['mean_panel']).abs().max() < 1e-9, (ticker, signal)
+
+
+def test_only_signals_with_gaps_get_their_own_returns(price_store):
+    columns = panel.build_panel(TICKERS, price_store).columns
+    assert 'OBV 1-day %' in columns
+    assert 'RSI 1-day %' not in columns
+    assert 'ADX 1-day %' not in columns
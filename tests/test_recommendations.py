@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from recommendations import encode_recommendations, UNKNOWN
+
+
+RULES = {"default": 0, "values": {"to Buy": 1, "Buy to Sell": -1}}
+
+
+def test_wordings_are_encoded_with_their_rule():
+    values, unmapped = encode_recommendations(
+        pd.Series(["to Buy", "Buy to Sell", "to Hold", np.nan, "to Hold"]), RULES
+    )
+    assert list(values) == [1, -1, 0, 0, 0]
+    assert unmapped.to_dict() == {"to Hold": 2}
+
+
+def test_nothing_to_encode():
+    for recommendations in (pd.Series([np.nan, np.nan], dtype=object), pd.Series([], dtype=object)):
+        values, unmapped = encode_recommendations(recommendations, RULES)
+        assert values.dtype == np.int64
+        assert list(values) == [UNKNOWN] * len(recommendations)
+        assert len(unmapped) == 0
@@ -0,0 +1,65 @@
+import multiprocessing
+import numpy as np
+import sentiment
+from sentiment import SentimentCache, headline_key
+
+
+VERSION = '0123456789abcdef'
+
+
+def keys(start, stop):
+    return [headline_key('headline {}'.format(i)) for i in range(start, stop)]
+
+
+def add_scores(path, start, stop):
+    cache = SentimentCache(path)
+    cache.load(VERSION)
+    cache.add(keys(start, stop), np.arange(start, stop) / 1000)
+
+
+def test_parallel_writers_on_a_fresh_cache(tmp_path):
+    # what the batch workers do, both start before either has written anything
+    context = multiprocessing.get_context('spawn')
+    writers = [context.Process(target=add_scores, args=(str(tmp_path), i * 100, i * 100 + 100)) for i in range(2)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    cache = SentimentCache(str(tmp_path))
+    cache.load(VERSION)
+    assert np.allclose(cache.lookup(keys(0, 200)), np.arange(200) / 1000)
+
+
+def test_broken_cache_is_rebuilt(tmp_path):
+    # an append-mode cache two writers both put a header in, and a shard that isn't a cache
+    with open(tmp_path / '{}.csv'.format(VERSION), 'w') as f:
+        f.write('Key,Compound\n{},0.5\nKey,Compound\n{},-0.25\n'.format(*keys(0, 2)))
+    with open(tmp_path / '{}-1-broken.csv'.format(VERSION), 'w') as f:
+        f.write('\x00\x01 not a csv\n')
+
+    cache = SentimentCache(str(tmp_path))
+    cache.load(VERSION)
+    assert list(cache.lookup(keys(0, 3))[:2]) == [0.5, -0.25]
+    assert np.isnan(cache.lookup(keys(2, 3))[0])
+    assert not (tmp_path / '{}-1-broken.csv'.format(VERSION)).exists()
+
+
+def test_shards_are_merged(tmp_path, monkeypatch):
+    monkeypatch.setattr(sentiment, 'MAX_SHARDS', 3)
+    writer = SentimentCache(str(tmp_path))
+    writer.load(VERSION)
+    for i in range(5):
+        writer.add(keys(i * 10, i * 10 + 10), np.arange(i * 10, i * 10 + 10) / 1000)
+    assert len(list(tmp_path.glob('{}*.csv'.format(VERSION)))) == 5
+    # another version's cache is left alone
+    (tmp_path / 'fedcba9876543210.csv').write_text('Key,Compound\n')
+
+    cache = SentimentCache(str(tmp_path))
+    cache.load(VERSION)
+    assert len(list(tmp_path.glob('{}*.csv'.format(VERSION)))) == 1
+    assert (tmp_path / 'fedcba9876543210.csv').exists()
+
+    again = SentimentCache(str(tmp_path))
+    again.load(VERSION)
+    assert np.allclose(again.lookup(keys(0, 50)), np.arange(50) / 1000)